@@ -0,0 +1,51 @@
+"""
+Session membership cache.
+Chat and signaling consumers authorize every connect against the session's
+participants; those ids are cached by session id for a short while so both
+peers' sockets don't each load the ChatSession row. Entries are dropped when
+a session's membership changes (a waiting session is claimed) or it ends.
+"""
+
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ChatSession
+
+ACCESS_PREFIX = 'chat:members'
+
+
+def access_key(session_id) -> str:
+    return f'{ACCESS_PREFIX}:{session_id}'
+
+
+def session_participants(session_id) -> Optional[Tuple[str, Optional[str]]]:
+    """(user_a_id, user_b_id) as strings, or None if the session doesn't exist."""
+    key = access_key(session_id)
+    participants = cache.get(key)
+    if participants is None:
+        row = ChatSession.objects.filter(id=session_id).values_list('user_a_id', 'user_b_id').first()
+        if row is None:
+            return None
+        participants = tuple(str(user_id) if user_id else None for user_id in row)
+        cache.set(key, participants, timeout=settings.CHAT_SESSION_ACCESS_TTL_SECONDS)
+    return tuple(participants)
+
+
+def is_participant(session_id, user_id) -> bool:
+    participants = session_participants(session_id)
+    return participants is not None and str(user_id) in participants
+
+
+def ticket_grants_session(scope, session_id) -> bool:
+    """Whether the socket's signed connect ticket (see users/tickets.py) was issued for this session."""
+    ticket = scope.get('ticket')
+    return ticket is not None and ticket.grants_session(session_id)
+
+
+def invalidate_sessions(session_ids: Iterable):
+    """Forget cached membership, e.g. when sessions end or gain their second user."""
+    keys = [access_key(session_id) for session_id in session_ids]
+    if keys:
+        cache.delete_many(keys)
@@ -1,11 +1,35 @@
-import json
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.utils import timezone
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import ChatSession, Message
+from .access import is_participant, ticket_grants_session
+from .persistence import MessageBuffer
+from .replay import get_replay_buffer
+from .throttle import ThrottledLogger
+from fusetalkconfig.metrics import get_counter
+from apps.users.principals import socket_principal
+from fusetalkconfig.codec import CodecConsumerMixin
 
-class ChatConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger(__name__)
+# Signaling logs once per message; keep that from flooding the logs during ICE gathering
+signaling_log = ThrottledLogger(logger, limit=20, interval=1.0)
+
+TYPING_RECEIVED = get_counter('chat.typing.received')
+TYPING_FORWARDED = get_counter('chat.typing.forwarded')
+# Same state as the last forward (repeated keystroke frames)
+TYPING_DUPLICATE = get_counter('chat.typing.suppressed_duplicate')
+# Started typing again within CHAT_TYPING_MIN_INTERVAL_MS of the last forward; deferred to the window's end
+TYPING_THROTTLED = get_counter('chat.typing.suppressed_throttled')
+# "Stopped typing" sent by the server because the client went quiet
+TYPING_TIMED_OUT = get_counter('chat.typing.timed_out')
+
+class ChatConsumer(CodecConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
-        self.user = self.scope['user']
+        self.user = socket_principal(self.scope['user'])
         
         if self.user.is_anonymous:
             await self.close(code=4001)
@@ -13,6 +37,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
             
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.session_group_name = f'chat_{self.session_id}'
+        # Last typing state sent to the group, and when; typing_state is the client's latest
+        self.typing_forwarded = False
+        self.typing_forwarded_at = 0.0
+        self.typing_state = False
+        self._typing_timeout = None
+        self._typing_trailing = None
 
         # Check if session exists and user is part of it
         session_exists = await self.check_session_access()
@@ -26,77 +56,157 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         await self.accept()
 
-    @database_sync_to_async
-    def check_session_access(self):
-        try:
-            session = ChatSession.objects.get(id=self.session_id)
-            return session.user_a == self.user or session.user_b == self.user
-        except ChatSession.DoesNotExist:
-            return False
+        # Reconnecting clients may pass ?last_seq=N instead of sending a resume frame
+        last_seq = parse_qs(self.scope.get('query_string', b'').decode()).get('last_seq')
+        if last_seq:
+            await self.handle_resume({'last_seq': last_seq[0]})
 
-    @database_sync_to_async
-    def save_message(self, content):
-        try:
-            session = ChatSession.objects.get(id=self.session_id)
-            Message.objects.create(
-                session=session,
-                sender=self.user,
-                content=content
-            )
-        except ChatSession.DoesNotExist:
-            pass
+    async def check_session_access(self):
+        # A ticket issued for this session already proves membership
+        if ticket_grants_session(self.scope, self.session_id):
+            return True
+        # Participant ids come from the shared membership cache
+        return await database_sync_to_async(is_participant)(self.session_id, self.user.id)
 
     async def disconnect(self, close_code):
+        self.cancel_typing_timers()
+        if getattr(self, 'typing_forwarded', False):
+            await self.forward_typing(False)
+
         await self.channel_layer.group_discard(
             self.session_group_name,
             self.channel_name
         )
+        # Don't leave this user's messages waiting on the flush timer
+        await MessageBuffer.for_current_loop().flush()
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        message_type = data['type']
+    async def receive_payload(self, data):
+        message_type = data.get('type')
 
         if message_type == 'chat_message':
             await self.handle_chat_message(data)
         elif message_type == 'typing':
             await self.handle_typing(data)
+        elif message_type == 'resume':
+            await self.handle_resume(data)
 
     async def handle_chat_message(self, data):
         content = data['content']
-        
-        # Save message to database
-        await self.save_message(content)
-        
+        # Sender and time come from the server, not the client
+        sent_at = timezone.now()
+        message = {
+            'type': 'chat_message',
+            'session_id': str(self.session_id),
+            'content': content,
+            'sender': self.user.nickname,
+            'timestamp': sent_at.isoformat()
+        }
+        message['seq'] = await get_replay_buffer().append(self.session_id, message)
+
         # Send message to group
-        await self.channel_layer.group_send(
-            self.session_group_name,
-            {
-                'type': 'chat_message',
-                'content': content,
-                'sender': data['sender'],
-                'timestamp': data['timestamp']
-            }
-        )
+        await self.channel_layer.group_send(self.session_group_name, message)
+
+        # Persisted in batches after the fan-out (see persistence.py)
+        await MessageBuffer.for_current_loop().add(self.session_id, self.user.id, content, sent_at)
+
+    async def handle_resume(self, data):
+        """Send the messages after the client's last_seq; complete=False means the gap outran the buffer."""
+        try:
+            last_seq = int(data.get('last_seq') or 0)
+        except (TypeError, ValueError):
+            await self.send_payload({'type': 'error', 'error': 'Invalid last_seq'})
+            return
+
+        messages, complete = await get_replay_buffer().since(self.session_id, last_seq)
+        await self.send_payload({
+            'type': 'replay',
+            'session_id': str(self.session_id),
+            'messages': messages,
+            'complete': complete
+        })
 
     async def handle_typing(self, data):
+        """Forward typing state changes only, throttled, with a server-side stop timeout."""
+        TYPING_RECEIVED.increment()
+        is_typing = bool(data.get('is_typing'))
+        self.typing_state = is_typing
+
+        if self._typing_timeout is not None:
+            self._typing_timeout.cancel()
+            self._typing_timeout = None
+        if is_typing:
+            self._typing_timeout = asyncio.get_running_loop().call_later(
+                settings.CHAT_TYPING_TIMEOUT_MS / 1000,
+                lambda: asyncio.ensure_future(self.typing_timed_out())
+            )
+
+        if is_typing == self.typing_forwarded:
+            TYPING_DUPLICATE.increment()
+            return
+        # Stops always go out so the peer never sees a stale indicator
+        wait = self.typing_forwarded_at + settings.CHAT_TYPING_MIN_INTERVAL_MS / 1000 - time.monotonic()
+        if is_typing and wait > 0:
+            TYPING_THROTTLED.increment()
+            # Forward whatever the latest state is once the window closes
+            if self._typing_trailing is None:
+                self._typing_trailing = asyncio.get_running_loop().call_later(
+                    wait,
+                    lambda: asyncio.ensure_future(self.typing_window_closed())
+                )
+            return
+
+        await self.forward_typing(is_typing)
+
+    async def forward_typing(self, is_typing):
+        self.typing_forwarded = is_typing
+        self.typing_forwarded_at = time.monotonic()
+        TYPING_FORWARDED.increment()
         await self.channel_layer.group_send(
             self.session_group_name,
             {
                 'type': 'typing_indicator',
+                'session_id': str(self.session_id),
                 'user': self.user.nickname,
-                'is_typing': data['is_typing']
+                'is_typing': is_typing
             }
         )
 
+    async def typing_window_closed(self):
+        self._typing_trailing = None
+        if self.typing_state != self.typing_forwarded:
+            await self.forward_typing(self.typing_state)
+
+    async def typing_timed_out(self):
+        self._typing_timeout = None
+        self.typing_state = False
+        if self.typing_forwarded:
+            TYPING_TIMED_OUT.increment()
+            await self.forward_typing(False)
+
+    def cancel_typing_timers(self):
+        for attr in ('_typing_timeout', '_typing_trailing'):
+            if getattr(self, attr, None) is not None:
+                getattr(self, attr).cancel()
+                setattr(self, attr, None)
+
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.send_payload(event)
 
     async def typing_indicator(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.send_payload(event)
+
+    async def session_ended(self, event):
+        await self.send_payload(event)
+
+class SignalingConsumer(CodecConsumerMixin, AsyncWebsocketConsumer):
+    """
+    WebRTC signaling between the two peers of a session.
+    Peers find each other through the signaling group once, then send straight
+    to each other's channel; ICE candidates are coalesced into short batches.
+    """
 
-class SignalingConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.user = self.scope['user']
+        self.user = socket_principal(self.scope['user'])
         
         # Add authentication check
         if self.user.is_anonymous:
@@ -105,6 +215,9 @@ class SignalingConsumer(AsyncWebsocketConsumer):
             
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.signaling_group_name = f'signaling_{self.session_id}'
+        self.peer_channel = None
+        self.pending_candidates = []
+        self._flush_handle = None
 
         # Check if user has access to this session
         session_exists = await self.check_session_access()
@@ -117,41 +230,92 @@ class SignalingConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         await self.accept()
+
+        # Announce ourselves; a peer that is already connected replies with its channel
+        await self.channel_layer.group_send(self.signaling_group_name, self.peer_event('signaling_peer', reply=True))
         
-        print(f"User {self.user.nickname} connected to signaling for session {self.session_id}")
+        signaling_log.info('signaling.connect', user=self.user.nickname, session=self.session_id)
 
-    @database_sync_to_async
-    def check_session_access(self):
-        try:
-            from .models import ChatSession
-            session = ChatSession.objects.get(id=self.session_id)
-            return session.user_a == self.user or session.user_b == self.user
-        except ChatSession.DoesNotExist:
-            return False
+    async def check_session_access(self):
+        # A ticket issued for this session already proves membership
+        if ticket_grants_session(self.scope, self.session_id):
+            return True
+        # Participant ids come from the shared membership cache
+        return await database_sync_to_async(is_participant)(self.session_id, self.user.id)
 
     async def disconnect(self, close_code):
+        if getattr(self, 'peer_channel', None):
+            await self.flush_candidates()
+            await self.channel_layer.send(self.peer_channel, self.peer_event('signaling_peer_left'))
+
         await self.channel_layer.group_discard(
             self.signaling_group_name,
             self.channel_name
         )
-        print(f"User {self.user.nickname} disconnected from signaling")
+        signaling_log.info('signaling.disconnect', user=self.user.nickname, session=self.session_id)
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        
-        print(f"Signaling message from {self.user.nickname}: {data.get('type')}")
+    async def receive_payload(self, data):
+        message_type = data.get('type')
         
-        # Forward signaling data to other peer
-        await self.channel_layer.group_send(
-            self.signaling_group_name,
-            {
-                'type': 'signaling_message',
-                'data': data,
-                'sender': self.channel_name
-            }
-        )
+        signaling_log.debug('signaling.message', user=self.user.nickname, type=message_type, direct=bool(self.peer_channel))
+
+        # Candidates come in bursts; hold them briefly and forward them together
+        if message_type == 'ice-candidate' and settings.SIGNALING_ICE_BATCH_MS > 0:
+            self.pending_candidates.append(data)
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(
+                    settings.SIGNALING_ICE_BATCH_MS / 1000,
+                    lambda: asyncio.ensure_future(self.flush_candidates())
+                )
+            return
+
+        # Earlier candidates must not arrive after this message
+        await self.flush_candidates()
+        await self.forward([data])
+
+    async def flush_candidates(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self.pending_candidates = self.pending_candidates, []
+        if batch:
+            await self.forward(batch)
+
+    async def forward(self, messages):
+        """Send signaling messages to the peer directly, or via the group until it is known."""
+        event = {
+            'type': 'signaling_batch',
+            'session_id': str(self.session_id),
+            'messages': messages,
+            'sender': self.channel_name
+        }
+        if self.peer_channel:
+            await self.channel_layer.send(self.peer_channel, event)
+        else:
+            await self.channel_layer.group_send(self.signaling_group_name, event)
+
+    def peer_event(self, event_type, **fields):
+        return {
+            'type': event_type,
+            'session_id': str(self.session_id),
+            'channel': self.channel_name,
+            **fields
+        }
+
+    async def signaling_peer(self, event):
+        if event['channel'] == self.channel_name:
+            return
+        self.peer_channel = event['channel']
+        if event.get('reply'):
+            await self.channel_layer.send(self.peer_channel, self.peer_event('signaling_peer'))
+
+    async def signaling_peer_left(self, event):
+        if event['channel'] == self.peer_channel:
+            self.peer_channel = None
 
-    async def signaling_message(self, event):
+    async def signaling_batch(self, event):
         # Don't send message back to sender
         if event['sender'] != self.channel_name:
-            await self.send(text_data=json.dumps(event['data']))
+            for data in event['messages']:
+                await self.send_payload(data)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_delete_reconnectrequest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(condition=models.Q(('status', 'waiting'), ('user_b__isnull', True)), fields=['created_at'], name='chat_waiting_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(condition=models.Q(('status', 'waiting'), ('user_b__isnull', True)), fields=['topic_tag', 'created_at'], name='chat_waiting_topic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user_a', 'status'], name='chat_user_a_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user_b', 'status'], name='chat_user_b_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_chatsession_chat_waiting_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='is_visitor',
+            field=models.BooleanField(default=False),
+        ),
+    ]
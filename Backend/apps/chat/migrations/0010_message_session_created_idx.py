@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_chatsession_is_visitor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['session', 'created_at', 'id'], name='message_session_created_idx'),
+        ),
+    ]
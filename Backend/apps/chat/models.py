@@ -1,6 +1,7 @@
 import uuid
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class ChatSession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -18,6 +19,7 @@ class ChatSession(models.Model):
     # Session details
     topic_tag = models.CharField(max_length=50, blank=True, null=True)
     language = models.CharField(max_length=20, default='mixed')
+    is_visitor = models.BooleanField(default=False)  # user_a joined the queue as a visitor
     
     STATUS_CHOICES = [
         ('waiting', 'Waiting for Match'),
@@ -33,6 +35,22 @@ class ChatSession(models.Model):
     
     class Meta:
         db_table = 'chat_sessions'
+        indexes = [
+            # Matching: oldest open waiting session, optionally by topic
+            models.Index(
+                fields=['created_at'],
+                name='chat_waiting_created_idx',
+                condition=models.Q(status='waiting', user_b__isnull=True),
+            ),
+            models.Index(
+                fields=['topic_tag', 'created_at'],
+                name='chat_waiting_topic_idx',
+                condition=models.Q(status='waiting', user_b__isnull=True),
+            ),
+            # join_queue cleanup of a user's previous sessions
+            models.Index(fields=['user_a', 'status'], name='chat_user_a_status_idx'),
+            models.Index(fields=['user_b', 'status'], name='chat_user_b_status_idx'),
+        ]
 
 class Message(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -40,11 +58,16 @@ class Message(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content = models.TextField()
     is_flagged = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Arrival time; buffered messages are written later (see persistence.py)
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         db_table = 'messages'
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of a session's history on (created_at, id)
+            models.Index(fields=['session', 'created_at', 'id'], name='message_session_created_idx'),
+        ]
 
 class FuseMoment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
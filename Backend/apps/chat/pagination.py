@@ -0,0 +1,101 @@
+"""
+Keyset pagination for a session's message history.
+Pages are addressed by an opaque (created_at, id) cursor instead of an offset,
+so each page is one range scan on message_session_created_idx no matter how
+deep into the conversation it is.
+"""
+
+import base64
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Message
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Compact field set returned for each message
+MESSAGE_FIELDS = ('id', 'sender_id', 'content', 'created_at')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, message_id) -> str:
+    raw = f'{created_at.isoformat()}|{message_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """The (created_at, id) a cursor points at; anything we didn't encode raises InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split('|')
+        created_at = datetime.fromisoformat(created_at)
+        message_id = uuid.UUID(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor '{cursor}'")
+    # Cursors are always encoded from aware timestamps
+    if timezone.is_naive(created_at):
+        raise InvalidCursor(f"Invalid cursor '{cursor}'")
+    return created_at, message_id
+
+
+def message_page(session_id, before: Optional[str] = None, since: Optional[str] = None,
+                 limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    One page of messages in chronological order.
+    Without cursors: the latest `limit` messages. `before` pages back into
+    older history; `since` fetches what arrived after a cursor, oldest first.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    messages = Message.objects.filter(session_id=session_id)
+
+    if since:
+        created_at, message_id = decode_cursor(since)
+        # created_at >= c AND NOT (created_at = c AND id <= id): a range scan, not an OR
+        messages = messages.filter(created_at__gte=created_at).exclude(
+            Q(created_at=created_at) & Q(id__lte=message_id)
+        ).order_by('created_at', 'id')
+    else:
+        if before:
+            created_at, message_id = decode_cursor(before)
+            messages = messages.filter(created_at__lte=created_at).exclude(
+                Q(created_at=created_at) & Q(id__gte=message_id)
+            )
+        messages = messages.order_by('-created_at', '-id')
+
+    rows = list(messages.values(*MESSAGE_FIELDS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not since:
+        rows.reverse()
+
+    results = [
+        {
+            'id': str(row['id']),
+            'sender': str(row['sender_id']),
+            'content': row['content'],
+            'created_at': row['created_at'].isoformat(),
+        }
+        for row in rows
+    ]
+
+    newest = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if rows else None
+    if since:
+        # More newer messages than fit in one page: call again with the new cursor
+        return {'results': results, 'since': newest or since, 'before': None, 'has_more': has_more}
+
+    return {
+        'results': results,
+        # Pass back as ?since= to fetch only messages newer than this page
+        'since': newest,
+        # Pass back as ?before= for the previous page of history, until the start is reached
+        'before': encode_cursor(rows[0]['created_at'], rows[0]['id']) if has_more else None,
+        'has_more': has_more,
+    }
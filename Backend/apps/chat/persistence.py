@@ -0,0 +1,131 @@
+"""
+Write-behind persistence for chat messages.
+ChatConsumer broadcasts a message first and then hands it to the buffer, which
+writes Message rows with bulk_create once CHAT_MESSAGE_BATCH_SIZE are pending
+or CHAT_MESSAGE_FLUSH_MS has passed since the first one, whichever comes first.
+Buffers are flushed on disconnect and at process exit. CHAT_MESSAGE_FLUSH_MS=0
+writes every message as it arrives. Rows keep the time the message arrived, not
+the time it was written. A batch the database couldn't take is kept and retried
+every CHAT_MESSAGE_RETRY_MS; only rows that can never be written are dropped,
+and while the database stays down the oldest messages beyond
+CHAT_MESSAGE_MAX_PENDING are.
+"""
+
+import asyncio
+import atexit
+import logging
+from datetime import datetime
+from typing import List
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, transaction
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer:
+    """Pending Message rows for one event loop."""
+
+    _buffers = {}
+
+    @classmethod
+    def for_current_loop(cls) -> 'MessageBuffer':
+        loop = asyncio.get_running_loop()
+        buffer = cls._buffers.get(loop)
+        if buffer is None:
+            buffer = cls._buffers[loop] = cls()
+        return buffer
+
+    def __init__(self):
+        self.pending: List[Message] = []
+        self._timer = None
+        # Set while a failed batch waits for its retry, so new messages don't flush inline
+        self._retrying = False
+
+    async def add(self, session_id, sender_id, content: str, created_at: datetime):
+        """Queue a message for writing; flushes inline once the batch is full or buffering is off."""
+        self.pending.append(Message(session_id=session_id, sender_id=sender_id, content=content,
+                                    created_at=created_at))
+        self._trim()
+
+        flush_ms = settings.CHAT_MESSAGE_FLUSH_MS
+        if not self._retrying and (flush_ms <= 0 or len(self.pending) >= settings.CHAT_MESSAGE_BATCH_SIZE):
+            await self.flush()
+        elif self._timer is None:
+            self._schedule(flush_ms)
+
+    async def flush(self):
+        """Write everything pending; on a database error the batch goes back to the front for a retry."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            await database_sync_to_async(write_messages)(batch)
+        except DatabaseError as e:
+            self.pending[:0] = batch
+            self._trim()
+            self._retrying = True
+            logger.warning(f"Failed to persist {len(batch)} chat messages, retrying: {str(e)}")
+            self._schedule(settings.CHAT_MESSAGE_RETRY_MS)
+        else:
+            self._retrying = False
+
+    def _trim(self):
+        """Drop the oldest pending messages beyond CHAT_MESSAGE_MAX_PENDING."""
+        overflow = len(self.pending) - settings.CHAT_MESSAGE_MAX_PENDING
+        if overflow > 0:
+            dropped, self.pending = self.pending[:overflow], self.pending[overflow:]
+            sessions = sorted({str(message.session_id) for message in dropped})
+            logger.error(f"Dropped {overflow} unwritten chat messages from sessions {', '.join(sessions)}")
+
+    def _schedule(self, delay_ms: int):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                max(delay_ms, 0) / 1000, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    @classmethod
+    def flush_all_sync(cls):
+        """Write every loop's pending messages; used at interpreter exit when no loop is running."""
+        for buffer in list(cls._buffers.values()):
+            batch, buffer.pending = buffer.pending, []
+            if not batch:
+                continue
+            try:
+                write_messages(batch)
+            except DatabaseError as e:
+                # Nothing is left to retry at exit
+                logger.error(f"Lost {len(batch)} chat messages at exit: {str(e)}")
+
+
+def write_messages(batch: List[Message]):
+    """
+    Insert a batch of messages. Rows that can never be written (deleted session
+    or sender, invalid data) are dropped; any other database error propagates
+    so the caller can retry the batch.
+    """
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(batch)
+    except (IntegrityError, DataError):
+        # One bad row rejects the whole insert; write the rest one by one
+        # A retried batch may have committed before the connection dropped
+        written = set(Message.objects.filter(id__in=[message.id for message in batch]).values_list('id', flat=True))
+        for message in batch:
+            if message.id in written:
+                continue
+            try:
+                with transaction.atomic():
+                    message.save(force_insert=True)
+            except (IntegrityError, DataError) as e:
+                logger.warning(f"Dropped chat message {message.id} for session {message.session_id}: {str(e)}")
+
+
+atexit.register(MessageBuffer.flush_all_sync)
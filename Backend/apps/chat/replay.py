@@ -0,0 +1,142 @@
+"""
+Recent-message replay for reconnecting chat sockets.
+Every chat message gets a per-session sequence number from the server, and the
+last CHAT_REPLAY_BUFFER_SIZE messages of each session are kept in a bounded
+buffer. A client that reconnects with the last seq it saw gets only the
+messages it missed; if the gap is older than the buffer, the reply says so and
+the client falls back to the history endpoint.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import List, Tuple
+
+from django.conf import settings
+
+# Assigns the next seq, appends the message with it and trims the buffer in one step
+APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+local message = cjson.decode(ARGV[1])
+message['seq'] = seq
+redis.call('RPUSH', KEYS[2], cjson.encode(message))
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+
+def missed_since(buffered: List[dict], last_seq: int) -> Tuple[List[dict], bool]:
+    """Messages after last_seq, and whether the buffer still covered everything since then."""
+    missed = [message for message in buffered if message['seq'] > last_seq]
+    complete = not missed or missed[0]['seq'] == last_seq + 1
+    return missed, complete
+
+
+class BaseReplayBuffer:
+    """Sequence numbers and recent messages per chat session."""
+
+    async def append(self, session_id, message: dict) -> int:
+        """Store a chat_message event and return the seq assigned to it."""
+        raise NotImplementedError
+
+    async def since(self, session_id, last_seq: int) -> Tuple[List[dict], bool]:
+        """Buffered messages with seq > last_seq, oldest first, and whether none are missing."""
+        raise NotImplementedError
+
+
+class MemoryReplayBuffer(BaseReplayBuffer):
+    """
+    Process-local buffers. Sequence numbers are only shared by sockets on this
+    worker, so this is for development and single-process deployments.
+    Like the Redis keys, a session expires ttl seconds after its last message.
+    """
+
+    def __init__(self, size: int, ttl: int):
+        self.size = size
+        self.ttl = ttl
+        # session id -> (seq, messages, expires_at), least recently appended first
+        self._sessions = OrderedDict()
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            key, (_, _, expires_at) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[key]
+
+    async def append(self, session_id, message: dict) -> int:
+        self._expire()
+        key = str(session_id)
+        seq, buffered, _ = self._sessions.pop(key, None) or (0, deque(maxlen=self.size), 0)
+        seq += 1
+        buffered.append({**message, 'seq': seq})
+        self._sessions[key] = (seq, buffered, time.monotonic() + self.ttl)
+        return seq
+
+    async def since(self, session_id, last_seq: int) -> Tuple[List[dict], bool]:
+        self._expire()
+        _, buffered, _ = self._sessions.get(str(session_id)) or (0, (), 0)
+        return missed_since(list(buffered), last_seq)
+
+
+class RedisReplayBuffer(BaseReplayBuffer):
+    """Buffers shared by all workers: a counter and a capped list per session in Redis."""
+
+    def __init__(self, url: str, size: int, ttl: int):
+        self.url = url
+        self.size = size
+        self.ttl = ttl
+        # redis.asyncio connections belong to the loop that opened them
+        self._clients = {}
+
+    def client(self):
+        import redis.asyncio
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = redis.asyncio.Redis.from_url(self.url, decode_responses=True)
+            client.append_message = client.register_script(APPEND_SCRIPT)
+        return client
+
+    @staticmethod
+    def keys(session_id) -> List[str]:
+        # Both keys share the session's hash tag so the script stays valid on Redis Cluster
+        return [f'chat:{{{session_id}}}:seq', f'chat:{{{session_id}}}:recent']
+
+    async def append(self, session_id, message: dict) -> int:
+        client = self.client()
+        return await client.append_message(
+            keys=self.keys(session_id), args=[json.dumps(message), self.size, self.ttl]
+        )
+
+    async def since(self, session_id, last_seq: int) -> Tuple[List[dict], bool]:
+        _, recent_key = self.keys(session_id)
+        buffered = await self.client().lrange(recent_key, 0, -1)
+        return missed_since([json.loads(message) for message in buffered], last_seq)
+
+
+REPLAY_BUFFERS = {
+    'memory': lambda: MemoryReplayBuffer(settings.CHAT_REPLAY_BUFFER_SIZE, settings.CHAT_REPLAY_TTL_SECONDS),
+    'redis': lambda: RedisReplayBuffer(
+        settings.CHAT_REPLAY_REDIS_URL, settings.CHAT_REPLAY_BUFFER_SIZE, settings.CHAT_REPLAY_TTL_SECONDS
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def _build_replay_buffer(name: str) -> BaseReplayBuffer:
+    try:
+        return REPLAY_BUFFERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown CHAT_REPLAY_BACKEND '{name}'")
+
+
+def get_replay_buffer() -> BaseReplayBuffer:
+    """Return the configured replay buffer (one instance per process)."""
+    return _build_replay_buffer(settings.CHAT_REPLAY_BACKEND)
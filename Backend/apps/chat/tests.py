@@ -1,3 +1,223 @@
-from django.test import TestCase
+import asyncio
+import base64
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from apps.matching.services import MatchingService
+from apps.users.models import User
+from fusetalkconfig.asgi import TokenAuthMiddleware
+from . import persistence
+from .access import access_key, is_participant, session_participants
+from .models import ChatSession, Message
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .replay import MemoryReplayBuffer
+from .routing import websocket_urlpatterns
+
+
+def raw_cursor(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+class MessageCursorTests(TestCase):
+    """Message history cursors round-trip, and anything else is a 400."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_a = User.objects.create(username='cursor_a', nickname='cursor_a')
+        cls.user_b = User.objects.create(username='cursor_b', nickname='cursor_b')
+        cls.session = ChatSession.objects.create(user_a=cls.user_a, user_b=cls.user_b, status='active')
+        cls.token = Token.objects.create(user=cls.user_a).key
+
+    def test_round_trip(self):
+        created_at, message_id = timezone.now(), uuid.uuid4()
+        self.assertEqual(decode_cursor(encode_cursor(created_at, message_id)), (created_at, message_id))
+
+    def test_malformed_cursors(self):
+        for cursor in [
+            raw_cursor('2024-01-01T00:00:00+00:00|notauuid'),
+            # Naive timestamps are never encoded
+            raw_cursor(f'2024-01-01T00:00:00|{uuid.uuid4()}'),
+            raw_cursor('yesterday|' + str(uuid.uuid4())),
+            raw_cursor('only-one-part'),
+            '!!not base64!!',
+        ]:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_view_rejects_malformed_cursors(self):
+        url = f'/api/chat/session/{self.session.id}/messages/'
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token}'}
+        for param in ('before', 'since'):
+            response = self.client.get(url, {param: raw_cursor('2024-01-01T00:00:00+00:00|notauuid')}, **headers)
+            self.assertEqual(response.status_code, 400, param)
+
+    def test_paging_back(self):
+        Message.objects.bulk_create([
+            Message(session=self.session, sender=self.user_a, content=str(i)) for i in range(5)
+        ])
+        url = f'/api/chat/session/{self.session.id}/messages/'
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token}'}
+
+        page = self.client.get(url, {'limit': 3}, **headers).json()
+        older = self.client.get(url, {'limit': 3, 'before': page['before']}, **headers).json()
+        contents = [m['content'] for m in older['results'] + page['results']]
+        self.assertEqual(sorted(contents), [str(i) for i in range(5)])
+        self.assertEqual(len(set(contents)), 5)
+        self.assertFalse(older['has_more'])
+
+
+@override_settings(
+    MATCH_QUEUE_ENGINE='orm',
+    MATCH_ROUNDS_ENABLED=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class SessionAccessCacheTests(TestCase):
+    """Cached session membership is dropped once a claim or "next" commits."""
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f'access_{i}', nickname=f'access_{i}') for i in range(3)]
+
+    def test_participants_are_cached(self):
+        session = ChatSession.objects.create(user_a=self.users[0], status='waiting')
+        self.assertTrue(is_participant(session.id, self.users[0].id))
+        with self.assertNumQueries(0):
+            self.assertEqual(session_participants(session.id), (str(self.users[0].id), None))
+        # Unknown sessions are not cached
+        self.assertIsNone(session_participants(uuid.uuid4()))
+
+    def test_claim_invalidates_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            waiting_id = MatchingService.join_queue(self.users[0], 'music', 'english', notify=False)['session_id']
+        self.assertFalse(is_participant(waiting_id, self.users[1].id))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = MatchingService.join_queue(self.users[1], 'music', 'english', notify=False)
+            self.assertEqual(result['session_id'], waiting_id)
+            # Still the old entry until the claim commits
+            self.assertFalse(is_participant(waiting_id, self.users[1].id))
+        for callback in callbacks:
+            callback()
+        self.assertTrue(is_participant(waiting_id, self.users[1].id))
+
+    def test_next_invalidates_the_ended_session(self):
+        session = ChatSession.objects.create(user_a=self.users[0], user_b=self.users[1], status='active')
+        self.assertTrue(is_participant(session.id, self.users[0].id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MatchingService.next_match(self.users[0], notify=False)
+        self.assertIsNone(cache.get(access_key(session.id)))
+
+
+class MemoryReplayBufferTests(SimpleTestCase):
+    """In-process replay buffers expire like the Redis keys do."""
+
+    def test_sessions_expire_after_their_last_message(self):
+        buffer = MemoryReplayBuffer(size=2, ttl=60)
+
+        async def replay():
+            with mock.patch('apps.chat.replay.time.monotonic', return_value=0):
+                for content in ('a', 'b', 'c'):
+                    await buffer.append('quiet', {'content': content})
+            with mock.patch('apps.chat.replay.time.monotonic', return_value=30):
+                await buffer.append('busy', {'content': 'a'})
+                missed, complete = await buffer.since('quiet', 1)
+                self.assertEqual([message['content'] for message in missed], ['b', 'c'])
+                self.assertTrue(complete)
+            with mock.patch('apps.chat.replay.time.monotonic', return_value=61):
+                await buffer.append('busy', {'content': 'b'})
+                self.assertEqual(list(buffer._sessions), ['busy'])
+                self.assertEqual(await buffer.since('quiet', 0), ([], True))
+
+        asyncio.run(replay())
+
+
+class MessagePersistenceTests(TransactionTestCase):
+    """Buffered message writes drop only rows that can never be written."""
+
+    def setUp(self):
+        self.user_a = User.objects.create(username='persist_a', nickname='persist_a')
+        self.user_b = User.objects.create(username='persist_b', nickname='persist_b')
+        self.session = ChatSession.objects.create(user_a=self.user_a, user_b=self.user_b, status='active')
+
+    def message(self, content, session_id=None, sender_id=None):
+        return Message(
+            session_id=session_id or self.session.id, sender_id=sender_id or self.user_a.id,
+            content=content, created_at=timezone.now()
+        )
+
+    def test_bad_rows_are_dropped(self):
+        written = self.message('already written')
+        written.save()
+        batch = [
+            self.message('one'),
+            self.message('deleted session', session_id=uuid.uuid4()),
+            self.message('deleted sender', sender_id=uuid.uuid4()),
+            written,
+            self.message('two'),
+        ]
+        persistence.write_messages(batch)
+        self.assertEqual(
+            sorted(Message.objects.values_list('content', flat=True)), ['already written', 'one', 'two']
+        )
+
+    @override_settings(CHAT_MESSAGE_FLUSH_MS=0, CHAT_MESSAGE_MAX_PENDING=3, CHAT_MESSAGE_RETRY_MS=60000)
+    def test_pending_is_capped_while_retrying(self):
+        buffer = persistence.MessageBuffer()
+
+        async def add_messages():
+            with mock.patch.object(persistence, 'write_messages', side_effect=OperationalError('down')):
+                for i in range(5):
+                    await buffer.add(self.session.id, self.user_a.id, str(i), timezone.now())
+            # The newest messages are kept, oldest first
+            self.assertEqual([message.content for message in buffer.pending], ['2', '3', '4'])
+            await buffer.flush()
+
+        asyncio.run(add_messages())
+        self.assertEqual(sorted(Message.objects.values_list('content', flat=True)), ['2', '3', '4'])
+
+
+@override_settings(
+    CHAT_TYPING_MIN_INTERVAL_MS=200,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class TypingIndicatorTests(TransactionTestCase):
+    """A throttled "started typing" is delivered when the throttle window closes."""
+
+    def setUp(self):
+        self.users = [User.objects.create(username=f'typing_{i}', nickname=f'typing_{i}') for i in range(2)]
+        self.session = ChatSession.objects.create(user_a=self.users[0], user_b=self.users[1], status='active')
+        self.tokens = [Token.objects.create(user=user).key for user in self.users]
+
+    def test_throttled_start_is_forwarded_late(self):
+        async def exchange():
+            typist, peer = [
+                WebsocketCommunicator(
+                    TokenAuthMiddleware(URLRouter(websocket_urlpatterns)),
+                    f'/ws/chat/{self.session.id}/?token={token}'
+                ) for token in self.tokens
+            ]
+            for communicator in (typist, peer):
+                connected, _ = await communicator.connect()
+                self.assertTrue(connected)
+
+            for is_typing in (True, False, True):
+                await typist.send_json_to({'type': 'typing', 'is_typing': is_typing})
+            self.assertTrue((await peer.receive_json_from())['is_typing'])
+            self.assertFalse((await peer.receive_json_from())['is_typing'])
+            # The second start lands inside the window, so it waits for the window to close
+            self.assertTrue(await peer.receive_nothing(timeout=0.1))
+            self.assertTrue((await peer.receive_json_from(timeout=1))['is_typing'])
+
+            for communicator in (typist, peer):
+                await communicator.disconnect()
+
+        asyncio.run(exchange())
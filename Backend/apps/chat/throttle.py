@@ -0,0 +1,45 @@
+"""
+Rate-limited structured logging for per-message hot paths.
+Each event key may log `limit` records per `interval` seconds; the next record
+after a quiet period reports how many were suppressed in between.
+"""
+
+import logging
+import threading
+import time
+
+
+class ThrottledLogger:
+    """Wraps a logger; records carry their fields both in `extra` and as key=value text."""
+
+    def __init__(self, logger: logging.Logger, limit: int = 10, interval: float = 1.0):
+        self.logger = logger
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def log(self, level: int, event: str, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            started, logged, suppressed = self._windows.get(event, (now, 0, 0))
+            if now - started >= self.interval:
+                started, logged = now, 0
+            if logged >= self.limit:
+                self._windows[event] = (started, logged, suppressed + 1)
+                return
+            self._windows[event] = (started, logged + 1, 0)
+
+        if suppressed:
+            fields['suppressed'] = suppressed
+        text = ' '.join(f'{key}={value}' for key, value in fields.items())
+        self.logger.log(level, f"{event} {text}", extra={'event': event, **fields})
+
+    def debug(self, event: str, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields):
+        self.log(logging.INFO, event, **fields)
@@ -7,36 +7,37 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import models
+from fusetalkconfig.async_api import async_api_view
+from .access import is_participant
 from .models import ChatSession, SessionLike, FuseMoment, ContactExchange
+from .pagination import DEFAULT_PAGE_SIZE, InvalidCursor, message_page
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def like_session(request, session_id):
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def like_session(request, session_id):
     """Like a chat session - creates Fuse Moment if mutual"""
     try:
-        session = get_object_or_404(ChatSession, id=session_id)
-        
+        session = await ChatSession.objects.select_related('user_a', 'user_b').filter(id=session_id).afirst()
+        if session is None:
+            return Response({'detail': 'Not found.'}, status=404)
+
         # Check if user is part of this session
-        if request.user not in [session.user_a, session.user_b]:
+        if request.user.id not in (session.user_a_id, session.user_b_id):
             return Response({'error': 'Not authorized'}, status=403)
-        
-        # Create or get like
-        like, created = SessionLike.objects.get_or_create(
+
+        like, created = await SessionLike.objects.aget_or_create(
             session=session,
             user=request.user
         )
-        
+
         if not created:
             return Response({'message': 'Already liked'}, status=200)
-        
-        # Check for mutual like
-        other_user = session.user_b if request.user == session.user_a else session.user_a
-        mutual_like = SessionLike.objects.filter(session=session, user=other_user).exists()
-        
+
+        other_user_id = session.user_b_id if request.user.id == session.user_a_id else session.user_a_id
+        mutual_like = await SessionLike.objects.filter(session=session, user_id=other_user_id).aexists()
+
         if mutual_like:
-            # Create Fuse Moment!
-            fuse_moment, created = FuseMoment.objects.get_or_create(
+            fuse_moment, created = await FuseMoment.objects.aget_or_create(
                 session=session,
                 defaults={
                     'user_a': session.user_a,
@@ -44,21 +45,44 @@ def like_session(request, session_id):
                     'summary_text': f'Great conversation between {session.user_a.nickname} and {session.user_b.nickname}!'
                 }
             )
-            
+
             return Response({
                 'message': 'Fuse Moment created!',
                 'fuse_moment': True,
                 'fuse_moment_id': str(fuse_moment.id)
             }, status=201)
-        
+
         return Response({
             'message': 'Session liked',
             'fuse_moment': False
         }, status=201)
-        
+
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def session_messages(request, session_id):
+    """
+    Message history for a session, keyset-paginated on (created_at, id).
+    ?before=<cursor> pages back through older messages, ?since=<cursor> fetches newer ones.
+    """
+    if not is_participant(session_id, request.user.id):
+        return Response({'error': 'Not authorized'}, status=403)
+
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+        page = message_page(
+            session_id,
+            before=request.query_params.get('before'),
+            since=request.query_params.get('since'),
+            limit=limit
+        )
+    except (InvalidCursor, ValueError) as e:
+        return Response({'error': str(e)}, status=400)
+
+    return Response(page, status=200)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def share_contact(request, fuse_moment_id):
@@ -103,18 +127,16 @@ def share_contact(request, fuse_moment_id):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
     
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_fuse_moments(request):
+@async_api_view(['GET'], permission_classes=[IsAuthenticated])
+async def get_fuse_moments(request):
     """Get user's Fuse Moments"""
     try:
         fuse_moments = FuseMoment.objects.filter(
-            models.Q(user_a=request.user) | models.Q(user_b=request.user)
+            models.Q(user_a_id=request.user.id) | models.Q(user_b_id=request.user.id)
         ).select_related('user_a', 'user_b', 'session').order_by('-created_at')
-        
-        data = []
-        for moment in fuse_moments:
-            data.append({
+
+        data = [
+            {
                 'id': str(moment.id),
                 'user_a': {'nickname': moment.user_a.nickname},
                 'user_b': {'nickname': moment.user_b.nickname},
@@ -125,10 +147,11 @@ def get_fuse_moments(request):
                     'id': str(moment.session.id),
                     'topic_tag': moment.session.topic_tag,
                 }
-            })
-        
+            }
+            async for moment in fuse_moments
+        ]
+
         return Response({'results': data}, status=200)
-        
+
     except Exception as e:
         return Response({'error': str(e)}, status=500)
-
@@ -3,16 +3,23 @@ WebSocket consumer for real-time matching notifications.
 Notifies users when they get matched or queue status changes.
 """
 
-import json
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 
+from apps.users.principals import socket_principal
+from fusetalkconfig.codec import CodecConsumerMixin
+
+from . import presence
+from .serializers import JoinQueueSerializer
+from .services import MatchingService
+from .updates import QueueUpdatePublisher
+
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-class MatchingConsumer(AsyncWebsocketConsumer):
+class MatchingConsumer(CodecConsumerMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for matching notifications.
     Users connect to receive real-time match updates.
@@ -20,7 +27,7 @@ class MatchingConsumer(AsyncWebsocketConsumer):
 
     async def connect(self):  # Fixed: proper indentation
         """Handle WebSocket connection."""
-        self.user = self.scope['user']
+        self.user = socket_principal(self.scope['user'])
         
         if self.user.is_anonymous:
             await self.close(code=4001)  # Custom close code for unauthorized
@@ -35,6 +42,11 @@ class MatchingConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
+
+        self.presence_buckets = await database_sync_to_async(presence.connected)(self.user.id)
+
+        # Position updates for waiting users are pushed from a shared background task
+        QueueUpdatePublisher.ensure_running()
         
         logger.info(f"User {self.user.nickname} connected to matching WebSocket")
 
@@ -46,37 +58,137 @@ class MatchingConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
 
+            # Nobody can be matched with a user whose last socket just closed
+            buckets = getattr(self, 'presence_buckets', [])
+            if await database_sync_to_async(presence.disconnected)(self.user.id, buckets):
+                try:
+                    if await self.leave_queue():
+                        logger.info(f"Evicted {self.user.nickname} from queue on disconnect")
+                except Exception as e:
+                    logger.error(f"Queue eviction error for {self.user.nickname}: {str(e)}")
+
         logger.info(f"User {self.user.nickname} disconnected from matching WebSocket")
 
-    async def receive(self, text_data):
-        """Handle messages from WebSocket (heartbeat, etc.)."""
+    async def receive_payload(self, data):
+        """Handle messages from WebSocket (heartbeat, queue join/leave/next)."""
+        message_type = data.get('type', 'unknown')
+
+        if message_type == 'heartbeat':
+            self.presence_buckets = await database_sync_to_async(presence.heartbeat)(
+                self.user.id, self.presence_buckets
+            )
+            await self.send_payload({
+                'type': 'heartbeat_response',
+                'status': 'alive'
+            })
+        elif message_type in ('join', 'next'):
+            await self.handle_join(data, message_type)
+        elif message_type == 'leave':
+            await self.handle_leave()
+
+    async def handle_join(self, data, message_type):
+        """
+        Join the queue over the socket, skipping the REST round trip.
+        'next' reuses the preferences of the previous join unless new ones are sent.
+        """
+        payload = data
+        if message_type == 'next' and getattr(self, 'match_preferences', None):
+            payload = {**self.match_preferences, **data}
+
+        serializer = JoinQueueSerializer(data=payload)
+        if not serializer.is_valid():
+            await self.send_error(message_type, 'Invalid data', serializer.errors)
+            return
+
+        self.match_preferences = dict(serializer.validated_data)
+
         try:
-            data = json.loads(text_data)
-            message_type = data.get('type', 'unknown')
-
-            if message_type == 'heartbeat':
-                await self.send(text_data=json.dumps({
-                    'type': 'heartbeat_response',
-                    'status': 'alive'
-                }))
-                
-        except json.JSONDecodeError:
-            logger.warning(f"Invalid JSON received from {self.user.nickname}")
+            if message_type == 'next':
+                # Ends the current session and rejoins in one transaction
+                result = await self.next_match(**self.match_preferences)
+            else:
+                result = await self.join_queue(**self.match_preferences)
+
+            messages = MatchingService._session_ended_messages(result.get('ended_session_ids', []), self.user)
+            if result['status'] == 'matched':
+                messages += MatchingService._match_messages(
+                    result['session_id'],
+                    result['matched_user_id'], result['matched_user'],
+                    self.user.id, self.user.nickname
+                )
+            if messages:
+                await MatchingService._asend_notifications(messages)
+
+            result['message'] = MatchingService.result_message(result)
+            result.pop('matched_user_id', None)
+
+            logger.info(f"Queue {message_type} (ws): {self.user.nickname} - {result['status']}")
+
+            await self.send_payload({'type': f'{message_type}_ack', **result})
+
+        except Exception as e:
+            logger.error(f"Queue {message_type} error for {self.user.nickname}: {str(e)}")
+            await self.send_error(message_type, 'Internal server error')
+
+    async def handle_leave(self):
+        """Leave the queue over the socket."""
+        try:
+            left = await self.leave_queue()
+            await self.send_payload({
+                'type': 'leave_ack',
+                'left': left,
+                'message': 'Successfully left the queue' if left else 'You were not in the queue'
+            })
+        except Exception as e:
+            logger.error(f"Queue leave error for {self.user.nickname}: {str(e)}")
+            await self.send_error('leave', 'Internal server error')
+
+    async def send_error(self, request_type, error, details=None):
+        """Send an error reply for a queue request."""
+        payload = {'type': 'error', 'request': request_type, 'error': error}
+        if details:
+            payload['details'] = details
+        await self.send_payload(payload)
+
+    @database_sync_to_async
+    def join_queue(self, vibe_tag, language, is_visitor):
+        # Notifications are sent from the event loop instead of async_to_sync
+        return MatchingService.join_queue(
+            user=self.user.as_user(),
+            vibe_tag=vibe_tag,
+            language=language,
+            is_visitor=is_visitor,
+            notify=False
+        )
+
+    @database_sync_to_async
+    def next_match(self, vibe_tag, language, is_visitor):
+        return MatchingService.next_match(
+            user=self.user.as_user(),
+            vibe_tag=vibe_tag,
+            language=language,
+            is_visitor=is_visitor,
+            notify=False
+        )
+
+    @database_sync_to_async
+    def leave_queue(self):
+        return MatchingService.leave_queue(self.user.as_user())
 
     # Message handlers for different notification types
     async def match_found(self, event):
         """Send match found notification."""
-        await self.send(text_data=json.dumps({
+        await self.send_payload({
             'type': 'match_found',
             'session_id': event['session_id'],
             'matched_user': event['matched_user'],
             'message': event['message']
-        }))
+        })
 
     async def queue_update(self, event):
         """Send queue position update."""
-        await self.send(text_data=json.dumps({
+        await self.send_payload({
             'type': 'queue_update',
             'position': event['position'],
             'message': event['message']
-        }))
+        })
@@ -0,0 +1,725 @@
+"""
+Pluggable match queue engines.
+An engine owns the "who is waiting" state and the pop-or-push pairing step,
+so the matching service can swap Postgres rows for Redis buckets via settings.
+"""
+
+import logging
+import threading
+import time
+from functools import lru_cache
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.chat.models import ChatSession
+from fusetalkconfig.metrics import get_metric
+from .models import MatchQueue, LANGUAGE_CHOICES
+from .presence import online_user_ids
+from .services import MatchingService
+from .stats import QueueCounters, stats_from_counts
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+VIBE_TAGS = [tag for tag, _ in MatchQueue.VIBE_TAG_CHOICES]
+LANGUAGES = [lang for lang, _ in LANGUAGE_CHOICES]
+
+# Time from locking a waiting-session row until the transaction holding it commits.
+# (Candidates are locked with SKIP LOCKED, so there is no lock wait to measure.)
+LOCK_HOLD = get_metric('join_queue.lock_hold')
+
+
+class QueueEntry(NamedTuple):
+    """A waiting user as seen by a matching round."""
+    user_id: str
+    vibe_tag: str
+    language: str
+    is_visitor: bool
+    enqueued_at: float
+
+
+class BaseQueueEngine:
+    """Interface every match queue engine implements."""
+
+    def join(self, user: User, vibe_tag: str, language: str, is_visitor: bool,
+             notify: bool = True) -> dict:
+        """Pair the user with a waiting partner or enqueue them. Returns the join_queue result."""
+        raise NotImplementedError
+
+    def leave(self, user: User) -> bool:
+        """Remove the user from the queue. Returns True if they were waiting."""
+        raise NotImplementedError
+
+    def discard(self, user: User):
+        """Drop any previous queue entry before a new join."""
+        self.leave(user)
+
+    def stats(self) -> dict:
+        """Waiting counts by vibe tag, language and visitor flag, read from counters."""
+        raise NotImplementedError
+
+    def position(self, user: User) -> Optional[int]:
+        """1-based position of the user within their bucket, or None if not waiting."""
+        raise NotImplementedError
+
+    def pending_updates(self) -> List[Tuple[str, int]]:
+        """
+        (user_id, position) for every user whose position may have changed since the
+        last call. Changes are coalesced per bucket, so each user appears at most once.
+        """
+        raise NotImplementedError
+
+    def reap_stale(self, cutoff: datetime, batch_size: int, max_batches: int) -> int:
+        """
+        Evict entries queued before cutoff whose owner has no open matching socket,
+        scanning at most max_batches batches of batch_size. Returns the number evicted.
+        """
+        raise NotImplementedError
+
+    # Pool API used by batch matching rounds (see rounds.py)
+
+    def enqueue(self, user: User, vibe_tag: str, language: str, is_visitor: bool) -> dict:
+        """Add the user to the round pool without attempting to pair them."""
+        raise NotImplementedError
+
+    def waiting(self, limit: Optional[int] = None) -> List[QueueEntry]:
+        """Snapshot of the round pool, oldest first."""
+        raise NotImplementedError
+
+    def claim_pairs(self, pairs: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Atomically remove paired users from the pool. Pairs where either side already left are skipped."""
+        raise NotImplementedError
+
+    def restore(self, entry: QueueEntry) -> bool:
+        """
+        Put a claimed entry back in the pool when its session could not be created.
+        Engines whose claims roll back with the surrounding transaction need not do anything.
+        """
+        return False
+
+
+class OrmQueueEngine(BaseQueueEngine):
+    """
+    Fallback engine backed by waiting ChatSession rows.
+    Pairing locks the oldest compatible waiting session with select_for_update.
+    Changed buckets are tracked in-process, so queue updates only cover joins
+    handled by this worker; use the redis engine when running several.
+    """
+
+    def __init__(self):
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self.counters = QueueCounters(VIBE_TAGS, LANGUAGES)
+
+    def _mark_dirty(self, *buckets):
+        with self._dirty_lock:
+            self._dirty.update(buckets)
+
+    def join(self, user, vibe_tag, language, is_visitor, notify=True):
+        with transaction.atomic():
+            waiting_session = None
+            locked_at = None
+            for _ in range(settings.MATCH_CLAIM_ATTEMPTS):
+                # Rows locked by concurrent joiners are skipped, not waited on
+                candidate = MatchingService._find_waiting_session(vibe_tag, language, is_visitor, user)
+                if candidate is None:
+                    break
+                if locked_at is None:
+                    locked_at = time.perf_counter()
+                    # Registered before any other hook, so it runs as the outermost commit
+                    # releases the lock and before notifications are delivered
+                    transaction.on_commit(lambda: LOCK_HOLD.observe(time.perf_counter() - locked_at))
+                if MatchingService._claim_waiting_session(candidate, user):
+                    waiting_session = candidate
+                    break
+
+            if waiting_session:
+                # Counted once the claim commits; a rolled-back join leaves the counters alone
+                bucket = (waiting_session.topic_tag, waiting_session.language, waiting_session.is_visitor)
+                transaction.on_commit(lambda: self._mark_dirty(bucket[:2]))
+                transaction.on_commit(lambda: self.counters.record(-1, *bucket))
+
+                # Notify both users (deferred until the row lock is released)
+                if notify:
+                    MatchingService._notify_match_found(waiting_session.user_a, user, waiting_session)
+
+                logger.info(f"Match found: {user.nickname} <-> {waiting_session.user_a.nickname}")
+
+                return {
+                    'status': 'matched',
+                    'session_id': str(waiting_session.id),
+                    'matched_user': waiting_session.user_a.nickname,
+                    'matched_user_id': str(waiting_session.user_a_id)
+                }
+
+            # No waiting session found, create new waiting session
+            session = ChatSession.objects.create(
+                user_a=user,
+                topic_tag=vibe_tag,
+                language=language,
+                is_visitor=is_visitor,
+                status='waiting'
+            )
+            transaction.on_commit(lambda: self.counters.record(1, vibe_tag, language, is_visitor))
+
+            logger.info(f"User {user.nickname} created waiting session")
+
+            return {
+                'status': 'queued',
+                'session_id': str(session.id),
+                'queue_position': self._session_position(session)
+            }
+
+    def leave(self, user):
+        with transaction.atomic():
+            waiting = ChatSession.objects.filter(user_a=user, status='waiting')
+            sessions = list(waiting.select_for_update().values_list('topic_tag', 'language', 'is_visitor'))
+            ended = waiting.update(status='ended', ended_at=timezone.now())
+
+            queued = MatchQueue.objects.filter(user=user)
+            entries = list(queued.select_for_update().values_list('vibe_tag', 'language', 'is_visitor'))
+            queued.delete()
+
+            transaction.on_commit(lambda: self._mark_dirty(*{(tag, lang) for tag, lang, _ in sessions}))
+            transaction.on_commit(lambda: self.counters.record_many(-1, sessions + entries))
+        return ended > 0 or bool(entries)
+
+    def stats(self):
+        return self.counters.snapshot(rebuild=self._count_waiting)
+
+    @staticmethod
+    def _count_waiting() -> dict:
+        """Rebuild counter values from the waiting rows (only when the counters are missing)."""
+        counts = {}
+        sessions = ChatSession.objects.filter(status='waiting', user_b__isnull=True).values_list(
+            'topic_tag', 'language', 'is_visitor'
+        ).annotate(count=Count('id'))
+        entries = MatchQueue.objects.values_list(
+            'vibe_tag', 'language', 'is_visitor'
+        ).annotate(count=Count('id')).order_by()
+        for vibe_tag, language, is_visitor, count in list(sessions) + list(entries):
+            fields = ['total', f'vibe:{vibe_tag}', f'lang:{language}']
+            if is_visitor:
+                fields.append('visitors')
+            for field in fields:
+                counts[field] = counts.get(field, 0) + count
+        return counts
+
+    @staticmethod
+    def _session_position(session: ChatSession) -> int:
+        # Range count on the chat_waiting_topic_idx partial index
+        return ChatSession.objects.filter(
+            status='waiting',
+            user_b__isnull=True,
+            topic_tag=session.topic_tag,
+            language=session.language,
+            created_at__lt=session.created_at
+        ).count() + 1
+
+    def position(self, user):
+        session = ChatSession.objects.filter(
+            user_a=user, status='waiting', user_b__isnull=True
+        ).order_by('-created_at').first()
+        return self._session_position(session) if session else None
+
+    def pending_updates(self):
+        with self._dirty_lock:
+            buckets, self._dirty = self._dirty, set()
+
+        updates = []
+        for topic_tag, language in buckets:
+            user_ids = ChatSession.objects.filter(
+                status='waiting',
+                user_b__isnull=True,
+                topic_tag=topic_tag,
+                language=language
+            ).order_by('created_at').values_list('user_a_id', flat=True)
+            updates.extend((str(user_id), index) for index, user_id in enumerate(user_ids, start=1))
+        return updates
+
+    def reap_stale(self, cutoff, batch_size, max_batches):
+        waiting = ChatSession.objects.filter(status='waiting', user_b__isnull=True)
+        sessions = []
+        for ids in self._stale_batches(waiting, 'user_a_id', cutoff, batch_size, max_batches):
+            with transaction.atomic():
+                # Rows locked by a joiner are about to be claimed; leave them alone
+                stale = waiting.filter(id__in=ids).select_for_update(skip_locked=True)
+                rows = list(stale.values_list('id', 'topic_tag', 'language', 'is_visitor'))
+                ChatSession.objects.filter(id__in=[row[0] for row in rows]).update(
+                    status='ended', ended_at=timezone.now()
+                )
+            sessions.extend(row[1:] for row in rows)
+
+        entries = []
+        for ids in self._stale_batches(MatchQueue.objects.all(), 'user_id', cutoff, batch_size, max_batches):
+            with transaction.atomic():
+                stale = MatchQueue.objects.filter(id__in=ids).select_for_update(skip_locked=True)
+                rows = list(stale.values_list('id', 'vibe_tag', 'language', 'is_visitor'))
+                MatchQueue.objects.filter(id__in=[row[0] for row in rows]).delete()
+            entries.extend(row[1:] for row in rows)
+
+        self._mark_dirty(*{(topic_tag, language) for topic_tag, language, _ in sessions})
+        self.counters.record_many(-1, sessions + entries)
+        return len(sessions) + len(entries)
+
+    @staticmethod
+    def _stale_batches(queryset, owner_field, cutoff, batch_size, max_batches):
+        """
+        Walk rows created before cutoff in (created_at, id) keyset order and
+        yield the ids of each batch whose owner is offline.
+        """
+        queryset = queryset.filter(created_at__lt=cutoff).order_by('created_at', 'id')
+        last = None
+        for _ in range(max_batches):
+            page = queryset
+            if last:
+                page = page.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+            rows = list(page.values_list('created_at', 'id', owner_field)[:batch_size])
+            if not rows:
+                return
+
+            online = online_user_ids({owner_id for _, _, owner_id in rows})
+            stale = [row_id for _, row_id, owner_id in rows if str(owner_id) not in online]
+            if stale:
+                yield stale
+
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][:2]
+
+    # Round pool lives in MatchQueue, which carries the visitor flag
+
+    def enqueue(self, user, vibe_tag, language, is_visitor):
+        MatchQueue.objects.create(
+            user=user,
+            vibe_tag=vibe_tag,
+            language=language,
+            is_visitor=is_visitor
+        )
+        transaction.on_commit(lambda: self.counters.record(1, vibe_tag, language, is_visitor))
+        return {
+            'status': 'queued',
+            'session_id': None,
+            'queue_position': MatchQueue.objects.filter(vibe_tag=vibe_tag, language=language).count()
+        }
+
+    def waiting(self, limit=None):
+        rows = MatchQueue.objects.order_by('created_at').values_list(
+            'user_id', 'vibe_tag', 'language', 'is_visitor', 'created_at'
+        )
+        if limit:
+            rows = rows[:limit]
+        return [
+            QueueEntry(str(user_id), vibe_tag, language, is_visitor, created_at.timestamp())
+            for user_id, vibe_tag, language, is_visitor, created_at in rows
+        ]
+
+    def claim_pairs(self, pairs):
+        user_ids = [user_id for pair in pairs for user_id in pair]
+        with transaction.atomic():
+            present = {
+                str(user_id) for user_id in MatchQueue.objects.select_for_update().filter(
+                    user_id__in=user_ids
+                ).values_list('user_id', flat=True)
+            }
+            claimed = [(a, b) for a, b in pairs if a in present and b in present]
+            claimed_entries = MatchQueue.objects.filter(
+                user_id__in=[user_id for pair in claimed for user_id in pair]
+            )
+            entries = list(claimed_entries.values_list('vibe_tag', 'language', 'is_visitor'))
+            claimed_entries.delete()
+
+            # A round rolls the claim back if its sessions can't be inserted
+            transaction.on_commit(lambda: self.counters.record_many(-1, entries))
+        return claimed
+
+
+# Shared prelude for scripts that change bucket membership.
+# KEYS[1] = member index hash, KEYS[2] = visitor set, KEYS[3] = dirty bucket set,
+# KEYS[4] = stats counter hash
+INDEX_LUA = """
+local members, visitors, dirty, stats = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+
+-- Adjust the waiting counters for a user entering (+1) or leaving (-1) a bucket
+local function count(bucket, delta, is_visitor)
+    local _, _, tag, lang = string.find(bucket, ':bucket:([^:]+):([^:]+)$')
+    redis.call('HINCRBY', stats, 'total', delta)
+    redis.call('HINCRBY', stats, 'vibe:' .. tag, delta)
+    redis.call('HINCRBY', stats, 'lang:' .. lang, delta)
+    if is_visitor then
+        redis.call('HINCRBY', stats, 'visitors', delta)
+    end
+end
+
+-- Remove a waiting user from a bucket and from every index; returns whether they were a visitor
+local function remove(bucket, user)
+    local is_visitor = redis.call('SREM', visitors, user) == 1
+    redis.call('ZREM', bucket, user)
+    redis.call('HDEL', members, user)
+    redis.call('SADD', dirty, bucket)
+    count(bucket, -1, is_visitor)
+    return is_visitor
+end
+"""
+
+# Pops the oldest compatible partner or pushes the caller, in one round trip.
+# KEYS[5] = caller's own bucket, KEYS[6..] = candidate buckets
+# ARGV[1] = user id, ARGV[2] = enqueue time (us), ARGV[3] = '1' if visitor,
+# ARGV[4..] = candidate count per priority tier (none when only pushing)
+# Returns [partner id, partner bucket, partner score, '1' if visitor] on a match,
+# or the caller's 0-based rank in their bucket when pushed.
+POP_OR_PUSH_SCRIPT = INDEX_LUA + """
+local own = KEYS[5]
+local user = ARGV[1]
+
+local previous = redis.call('HGET', members, user)
+if previous then
+    remove(previous, user)
+end
+
+local idx = 6
+for t = 4, #ARGV do
+    local size = tonumber(ARGV[t])
+    local best_key, best_member, best_score, best_raw
+    for i = idx, idx + size - 1 do
+        local head = redis.call('ZRANGE', KEYS[i], 0, 0, 'WITHSCORES')
+        if head[1] and (best_score == nil or tonumber(head[2]) < best_score) then
+            best_key, best_member, best_score, best_raw = KEYS[i], head[1], tonumber(head[2]), head[2]
+        end
+    end
+    idx = idx + size
+    if best_key then
+        local was_visitor = remove(best_key, best_member)
+        return {best_member, best_key, best_raw, was_visitor and '1' or '0'}
+    end
+end
+
+-- Keep scores strictly increasing so ranks never tie
+local score = tonumber(ARGV[2])
+local tail = redis.call('ZRANGE', own, -1, -1, 'WITHSCORES')
+if tail[2] and score <= tonumber(tail[2]) then
+    score = tonumber(tail[2]) + 1
+end
+redis.call('ZADD', own, score, user)
+redis.call('HSET', members, user, own)
+if ARGV[3] == '1' then
+    redis.call('SADD', visitors, user)
+end
+count(own, 1, ARGV[3] == '1')
+return redis.call('ZRANK', own, user)
+"""
+
+# Puts a popped partner back at their original place when their session could not be created.
+# KEYS[5] = partner's bucket, ARGV[1] = user id, ARGV[2] = original score, ARGV[3] = '1' if visitor
+# Returns 0 without changes if the user is already waiting again.
+RESTORE_SCRIPT = INDEX_LUA + """
+local user = ARGV[1]
+if redis.call('HGET', members, user) then
+    return 0
+end
+redis.call('ZADD', KEYS[5], ARGV[2], user)
+redis.call('HSET', members, user, KEYS[5])
+if ARGV[3] == '1' then
+    redis.call('SADD', visitors, user)
+end
+redis.call('SADD', dirty, KEYS[5])
+count(KEYS[5], 1, ARGV[3] == '1')
+return 1
+"""
+
+# ARGV[1] = user id. Returns 1 if the user was waiting.
+REMOVE_SCRIPT = INDEX_LUA + """
+local bucket = redis.call('HGET', members, ARGV[1])
+if not bucket then
+    return 0
+end
+remove(bucket, ARGV[1])
+return 1
+"""
+
+# Removes both sides of each pair only if both are still waiting.
+# ARGV = a1, b1, a2, b2, ...
+# Returns the 1-based indexes of the pairs that were claimed.
+CLAIM_PAIRS_SCRIPT = INDEX_LUA + """
+local claimed = {}
+for i = 1, #ARGV, 2 do
+    local a, b = ARGV[i], ARGV[i + 1]
+    local bucket_a = redis.call('HGET', members, a)
+    local bucket_b = redis.call('HGET', members, b)
+    if bucket_a and bucket_b then
+        remove(bucket_a, a)
+        remove(bucket_b, b)
+        table.insert(claimed, (i + 1) / 2)
+    end
+end
+return claimed
+"""
+
+# Removes users who have been waiting since before a cutoff.
+# ARGV[1] = cutoff (us), ARGV[2..] = user ids. Returns the number removed.
+REAP_SCRIPT = INDEX_LUA + """
+local cutoff = tonumber(ARGV[1])
+local removed = 0
+for i = 2, #ARGV do
+    local bucket = redis.call('HGET', members, ARGV[i])
+    if bucket then
+        local score = redis.call('ZSCORE', bucket, ARGV[i])
+        if score and tonumber(score) < cutoff then
+            remove(bucket, ARGV[i])
+            removed = removed + 1
+        end
+    end
+end
+return removed
+"""
+
+# KEYS[1] = member index hash, ARGV[1] = user id. Returns the 0-based rank or nil.
+POSITION_SCRIPT = """
+local bucket = redis.call('HGET', KEYS[1], ARGV[1])
+if not bucket then
+    return nil
+end
+return redis.call('ZRANK', bucket, ARGV[1])
+"""
+
+# KEYS[1] = dirty bucket set. Returns and clears every dirty bucket.
+POP_DIRTY_SCRIPT = """
+local buckets = redis.call('SMEMBERS', KEYS[1])
+redis.call('DEL', KEYS[1])
+return buckets
+"""
+
+
+class RedisQueueEngine(BaseQueueEngine):
+    """
+    Engine backed by one Redis sorted set per (vibe_tag, language) bucket,
+    scored by enqueue time (microseconds). Waiting users never touch Postgres; a ChatSession
+    row is only written once a pair exists, directly as 'active'.
+    """
+
+    # All keys share one hash tag so the Lua scripts stay valid on Redis Cluster
+    KEY_PREFIX = '{matchq}'
+
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._pop_or_push = self.client.register_script(POP_OR_PUSH_SCRIPT)
+        self._remove = self.client.register_script(REMOVE_SCRIPT)
+        self._restore = self.client.register_script(RESTORE_SCRIPT)
+        self._claim_pairs = self.client.register_script(CLAIM_PAIRS_SCRIPT)
+        self._position = self.client.register_script(POSITION_SCRIPT)
+        self._pop_dirty = self.client.register_script(POP_DIRTY_SCRIPT)
+        self._reap = self.client.register_script(REAP_SCRIPT)
+
+    @property
+    def members_key(self) -> str:
+        return f'{self.KEY_PREFIX}:members'
+
+    @property
+    def visitors_key(self) -> str:
+        return f'{self.KEY_PREFIX}:visitors'
+
+    @property
+    def dirty_key(self) -> str:
+        return f'{self.KEY_PREFIX}:dirty'
+
+    @property
+    def stats_key(self) -> str:
+        return f'{self.KEY_PREFIX}:stats'
+
+    @property
+    def index_keys(self) -> List[str]:
+        return [self.members_key, self.visitors_key, self.dirty_key, self.stats_key]
+
+    def bucket_key(self, vibe_tag: str, language: str) -> str:
+        return f'{self.KEY_PREFIX}:bucket:{vibe_tag}:{language}'
+
+    @staticmethod
+    def _compatible_languages(language: str) -> List[str]:
+        """Languages a user can be paired with, exact match first."""
+        if language == 'mixed':
+            return ['mixed'] + [lang for lang in LANGUAGES if lang != 'mixed']
+        return [language, 'mixed']
+
+    def candidate_tiers(self, vibe_tag: str, language: str) -> List[List[str]]:
+        """
+        Candidate buckets grouped by the same priorities as the ORM path:
+        1. Same vibe tag  2. Random tag  3. Any vibe tag - all with compatible language.
+        """
+        languages = self._compatible_languages(language)
+        tiers = []
+        if vibe_tag != 'random':
+            tiers.append([self.bucket_key(vibe_tag, lang) for lang in languages])
+        tiers.append([self.bucket_key('random', lang) for lang in languages])
+        tiers.append([
+            self.bucket_key(tag, lang)
+            for tag in VIBE_TAGS if tag not in (vibe_tag, 'random')
+            for lang in languages
+        ])
+        return tiers
+
+    def pop_or_push(self, user_id: str, vibe_tag: str, language: str,
+                    is_visitor: bool = False, pair: bool = True) -> Tuple[Optional[QueueEntry], Optional[int]]:
+        """
+        Atomically claim a partner, or enqueue the user.
+        Returns (partner_entry, None) on a match and (None, queue_position) otherwise.
+        """
+        tiers = self.candidate_tiers(vibe_tag, language) if pair else []
+        keys = self.index_keys + [self.bucket_key(vibe_tag, language)]
+        for tier in tiers:
+            keys.extend(tier)
+        args = [user_id, int(time.time() * 1_000_000), '1' if is_visitor else '0']
+        args += [len(tier) for tier in tiers]
+
+        result = self._pop_or_push(keys=keys, args=args)
+        if isinstance(result, int):
+            return None, result + 1
+        partner_id, bucket, score, visitor = result
+        partner_vibe, partner_language = bucket.rsplit(':', 2)[1:]
+        return QueueEntry(partner_id, partner_vibe, partner_language, visitor == '1', float(score) / 1_000_000), None
+
+    def restore(self, entry: QueueEntry) -> bool:
+        """Put a popped partner back where they were waiting, unless they have rejoined since."""
+        return bool(self._restore(
+            keys=self.index_keys + [self.bucket_key(entry.vibe_tag, entry.language)],
+            args=[entry.user_id, round(entry.enqueued_at * 1_000_000), '1' if entry.is_visitor else '0']
+        ))
+
+    def join(self, user, vibe_tag, language, is_visitor, notify=True):
+        while True:
+            entry, position = self.pop_or_push(str(user.id), vibe_tag, language, is_visitor)
+
+            if entry is None:
+                logger.info(f"User {user.nickname} queued in bucket {vibe_tag}/{language}")
+                return {
+                    'status': 'queued',
+                    'session_id': None,
+                    'queue_position': position
+                }
+
+            # The partner has left Redis; until the session exists they must not be lost
+            try:
+                partner = User.objects.only('id', 'nickname').get(id=entry.user_id)
+            except User.DoesNotExist:
+                logger.warning(f"Dropped deleted user {entry.user_id} from the queue")
+                continue
+            except Exception:
+                self.restore(entry)
+                raise
+            try:
+                session = MatchingService._create_session(partner, user, vibe_tag, language)
+            except Exception:
+                self.restore(entry)
+                raise
+            break
+
+        if notify:
+            MatchingService._notify_match_found(partner, user, session)
+
+        logger.info(f"Match found: {user.nickname} <-> {partner.nickname}")
+
+        return {
+            'status': 'matched',
+            'session_id': str(session.id),
+            'matched_user': partner.nickname,
+            'matched_user_id': str(partner.id)
+        }
+
+    def leave(self, user):
+        return bool(self._remove(keys=self.index_keys, args=[str(user.id)]))
+
+    def discard(self, user):
+        # pop_or_push already drops the previous entry atomically
+        pass
+
+    def stats(self):
+        return stats_from_counts(self.client.hgetall(self.stats_key))
+
+    def position(self, user):
+        rank = self._position(keys=[self.members_key], args=[str(user.id)])
+        return None if rank is None else rank + 1
+
+    def pending_updates(self):
+        buckets = self._pop_dirty(keys=[self.dirty_key])
+        if not buckets:
+            return []
+
+        pipe = self.client.pipeline(transaction=False)
+        for bucket in buckets:
+            pipe.zrange(bucket, 0, -1)
+        return [
+            (user_id, index)
+            for members in pipe.execute()
+            for index, user_id in enumerate(members, start=1)
+        ]
+
+    def reap_stale(self, cutoff, batch_size, max_batches):
+        cutoff_us = int(cutoff.timestamp() * 1_000_000)
+        reaped, cursor = 0, 0
+        for _ in range(max_batches):
+            cursor, members = self.client.hscan(self.members_key, cursor, count=batch_size)
+            online = online_user_ids(members)
+            stale = [user_id for user_id in members if user_id not in online]
+            if stale:
+                # Age is re-checked inside the script, so a user who just rejoined survives
+                reaped += self._reap(keys=self.index_keys, args=[cutoff_us] + stale)
+            if cursor == 0:
+                break
+        return reaped
+
+    def enqueue(self, user, vibe_tag, language, is_visitor):
+        _, position = self.pop_or_push(str(user.id), vibe_tag, language, is_visitor, pair=False)
+        return {
+            'status': 'queued',
+            'session_id': None,
+            'queue_position': position
+        }
+
+    def waiting(self, limit=None):
+        buckets = [(tag, lang) for tag in VIBE_TAGS for lang in LANGUAGES]
+        pipe = self.client.pipeline(transaction=False)
+        for tag, lang in buckets:
+            pipe.zrange(self.bucket_key(tag, lang), 0, (limit or 0) - 1, withscores=True)
+        pipe.smembers(self.visitors_key)
+        *ranges, visitors = pipe.execute()
+
+        entries = [
+            QueueEntry(user_id, tag, lang, user_id in visitors, score / 1_000_000)
+            for (tag, lang), members in zip(buckets, ranges)
+            for user_id, score in members
+        ]
+        entries.sort(key=lambda entry: entry.enqueued_at)
+        return entries[:limit] if limit else entries
+
+    def claim_pairs(self, pairs):
+        if not pairs:
+            return []
+        args = [user_id for pair in pairs for user_id in pair]
+        indexes = self._claim_pairs(keys=self.index_keys, args=args)
+        return [pairs[int(index) - 1] for index in indexes]
+
+
+ENGINES = {
+    'orm': lambda: OrmQueueEngine(),
+    'redis': lambda: RedisQueueEngine(settings.MATCH_QUEUE_REDIS_URL),
+}
+
+
+@lru_cache(maxsize=None)
+def _build_engine(name: str) -> BaseQueueEngine:
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown MATCH_QUEUE_ENGINE '{name}'")
+
+
+def get_queue_engine() -> BaseQueueEngine:
+    """Return the configured queue engine (one instance per process)."""
+    return _build_engine(getattr(settings, 'MATCH_QUEUE_ENGINE', 'orm'))
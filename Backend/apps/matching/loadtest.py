@@ -0,0 +1,235 @@
+"""
+Matching load-test harness.
+Drives simulated users through join_queue (directly, or over the /ws/matching/
+consumer) on one event loop, and measures join throughput, time from join to
+the match_found event being delivered, lock hold time, and pairing integrity.
+Used by `manage.py loadtest_matching` and by the matching tests.
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+from typing import List, Optional
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from apps.chat.models import ChatSession
+from fusetalkconfig.metrics import LatencyMetric
+from .engines import LOCK_HOLD, VIBE_TAGS, get_queue_engine
+from .services import MatchingService
+
+User = get_user_model()
+
+MODES = ('service', 'websocket')
+
+
+class SimulatedUser:
+    """One load-test participant and what happened to it."""
+
+    def __init__(self, user, vibe_tag: str, language: str):
+        self.user = user
+        self.vibe_tag = vibe_tag
+        self.language = language
+        self.joined_at = None
+        self.result = None
+        self.matched_at = None
+        self.session_id = None
+
+
+class MatchingLoadTest:
+    """
+    Run N joins with at most `concurrency` in flight and collect a JSON-able report.
+    `parallel` runs service-mode joins on a thread pool instead of the single
+    thread-sensitive executor daphne uses, to exercise row-lock contention.
+    """
+
+    def __init__(self, users: int = 200, mode: str = 'service', concurrency: int = 20,
+                 vibe_tags: Optional[List[str]] = None, language: str = 'mixed',
+                 parallel: bool = False, timeout: float = 10.0, seed: Optional[int] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown load test mode '{mode}'")
+        self.user_count = users
+        self.mode = mode
+        self.concurrency = concurrency
+        self.vibe_tags = vibe_tags or VIBE_TAGS
+        self.language = language
+        self.parallel = parallel
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.prefix = f'loadtest_{uuid.uuid4().hex[:8]}'
+
+    def run(self) -> dict:
+        users = self.create_users()
+        try:
+            return asyncio.run(self.drive(users))
+        finally:
+            self.cleanup(users)
+
+    def create_users(self) -> List[SimulatedUser]:
+        users = User.objects.bulk_create([
+            User(username=f'{self.prefix}_{i}', nickname=f'{self.prefix}_{i}')
+            for i in range(self.user_count)
+        ])
+        return [
+            SimulatedUser(user, self.rng.choice(self.vibe_tags), self.language)
+            for user in users
+        ]
+
+    def cleanup(self, users: List[SimulatedUser]):
+        engine = get_queue_engine()
+        for simulated in users:
+            engine.leave(simulated.user)
+        # Cascades to the sessions created by the run
+        User.objects.filter(username__startswith=f'{self.prefix}_').delete()
+
+    async def drive(self, users: List[SimulatedUser]) -> dict:
+        LOCK_HOLD.reset()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        listen = self.listen_service if self.mode == 'service' else self.listen_websocket
+
+        # Every user is listening before anyone joins, so no match_found is missed
+        listeners = [await listen(simulated) for simulated in users]
+
+        async def join(simulated, send_join):
+            async with semaphore:
+                simulated.joined_at = time.perf_counter()
+                simulated.result = await send_join()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            join(simulated, send_join) for simulated, (_, send_join, _) in zip(users, listeners)
+        ))
+        join_seconds = time.perf_counter() - started
+
+        await asyncio.wait(
+            [asyncio.ensure_future(matched.wait()) for matched, _, _ in listeners],
+            timeout=self.timeout
+        )
+        report = await database_sync_to_async(self.report)(users, join_seconds)
+
+        for _, _, close in listeners:
+            await close()
+        return report
+
+    async def listen_service(self, simulated):
+        """Subscribe a bare channel to the user's group and join via MatchingService."""
+        channel_layer = get_channel_layer()
+        group = f'user_{simulated.user.id}'
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(group, channel)
+        matched = asyncio.Event()
+
+        async def read():
+            while True:
+                message = await channel_layer.receive(channel)
+                if message['type'] == 'match_found':
+                    self.record_match(simulated, message)
+                    matched.set()
+
+        reader = asyncio.ensure_future(read())
+        join = database_sync_to_async(MatchingService.join_queue, thread_sensitive=not self.parallel)
+
+        async def send_join():
+            return await join(simulated.user, simulated.vibe_tag, simulated.language)
+
+        async def close():
+            reader.cancel()
+            await channel_layer.group_discard(group, channel)
+
+        return matched, send_join, close
+
+    async def listen_websocket(self, simulated):
+        """Connect a MatchingConsumer for the user and join over the socket."""
+        from .routing import websocket_urlpatterns
+
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/matching/')
+        communicator.scope['user'] = simulated.user
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError(f"Matching socket refused {simulated.user.nickname}")
+
+        matched = asyncio.Event()
+        acks = asyncio.Queue()
+
+        async def read():
+            while True:
+                message = await communicator.receive_json_from(timeout=None)
+                if message['type'] == 'match_found':
+                    self.record_match(simulated, message)
+                    matched.set()
+                elif message['type'] in ('join_ack', 'error'):
+                    await acks.put(message)
+
+        reader = asyncio.ensure_future(read())
+
+        async def send_join():
+            await communicator.send_json_to({
+                'type': 'join',
+                'vibe_tag': simulated.vibe_tag,
+                'language': simulated.language,
+            })
+            return await asyncio.wait_for(acks.get(), timeout=self.timeout)
+
+        async def close():
+            reader.cancel()
+            await communicator.disconnect()
+
+        return matched, send_join, close
+
+    @staticmethod
+    def record_match(simulated, message):
+        simulated.matched_at = time.perf_counter()
+        simulated.session_id = message['session_id']
+
+    def report(self, users: List[SimulatedUser], join_seconds: float) -> dict:
+        errors = [simulated for simulated in users if simulated.result.get('type') == 'error']
+        user_ids = [simulated.user.id for simulated in users]
+
+        # Integrity is checked against the database, not the events
+        participants = Counter()
+        active = ChatSession.objects.filter(status='active', user_a_id__in=user_ids)
+        sessions = list(active.values_list('user_a_id', 'user_b_id'))
+        for user_a_id, user_b_id in sessions:
+            participants[user_a_id] += 1
+            participants[user_b_id] += 1
+        engine = get_queue_engine()
+        waiting = {simulated.user.id for simulated in users if engine.position(simulated.user)}
+
+        latency = LatencyMetric('loadtest.join_to_match_found', window=len(users))
+        for simulated in users:
+            if simulated.matched_at is not None:
+                latency.observe(simulated.matched_at - simulated.joined_at)
+
+        matched_users = set(participants)
+        return {
+            'mode': self.mode,
+            'engine': type(engine).__name__,
+            'database': connection.vendor,
+            'users': len(users),
+            'concurrency': self.concurrency,
+            'parallel': self.parallel,
+            'join_seconds': join_seconds,
+            'joins_per_second': len(users) / join_seconds if join_seconds else 0.0,
+            'join_to_match_found': latency.snapshot(),
+            'lock_hold': LOCK_HOLD.snapshot(),
+            'sessions': len(sessions),
+            'matched_users': len(matched_users),
+            'waiting_users': len(waiting - matched_users),
+            'errors': len(errors),
+            # A user in more than one active session
+            'double_matches': sum(1 for count in participants.values() if count > 1),
+            # Neither matched nor still waiting
+            'lost_users': len(set(user_ids) - matched_users - waiting),
+            # Matched in the database but match_found never arrived
+            'undelivered': sum(
+                1 for simulated in users
+                if simulated.user.id in matched_users and simulated.matched_at is None
+            ),
+        }
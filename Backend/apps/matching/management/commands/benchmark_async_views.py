@@ -0,0 +1,166 @@
+"""
+Load benchmark: requests/sec and tail latency of the async views for
+join/leave, like and fuse moments, served natively vs held on a sync request
+thread, driven concurrently through Django's ASGI handler in-process (as
+daphne would run them). The sync variant runs the same view through
+async_to_sync, so like a sync APIView it holds its request's executor thread
+for auth, parsing, rendering and logging too; served natively the view only
+hops onto a thread for database work. Run it against Postgres:
+SQLite serialises writers, so join_leave and like fail with "database is locked".
+Seeded users, sessions and fuse moments are deleted afterwards.
+"""
+
+import asyncio
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.testing import HttpCommunicator
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import path
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authtoken.models import Token
+
+from apps.chat import views as chat_views
+from apps.chat.models import ChatSession, FuseMoment
+from apps.matching import views as matching_views
+from apps.matching.engines import OrmQueueEngine, get_queue_engine
+from apps.users.models import User
+from fusetalkconfig.metrics import LatencyMetric
+
+
+def held_on_thread(view):
+    """The async view as a sync Django view: its request thread is blocked until the view returns."""
+    @csrf_exempt
+    def sync_view(request, *args, **kwargs):
+        return async_to_sync(view)(request, *args, **kwargs)
+    return sync_view
+
+
+VIEWS = [
+    ('join/', matching_views.join_queue),
+    ('leave/', matching_views.leave_queue),
+    ('like/<uuid:session_id>/', chat_views.like_session),
+    ('fuse-moments/', chat_views.get_fuse_moments),
+]
+
+# Served as ROOT_URLCONF for the duration of the run
+urlpatterns = [path(f'sync/{route}', held_on_thread(view)) for route, view in VIEWS] + [
+    path(f'async/{route}', view) for route, view in VIEWS
+]
+
+JOIN_BODY = b'{"vibe_tag": "random", "language": "mixed"}'
+
+# Each scenario is the (method, path, body) requests one user makes per round
+SCENARIOS = {
+    'join_leave': lambda seed: [('POST', 'join/', JOIN_BODY), ('POST', 'leave/', b'')],
+    'like': lambda seed: [('POST', f"like/{seed['session_id']}/", b'')],
+    'fuse_moments': lambda seed: [('GET', 'fuse-moments/', b'')],
+}
+
+
+class Command(BaseCommand):
+    help = "Compare throughput and tail latency of the async REST views served natively vs on a sync thread"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Seeded users (each with a session and fuse moment)")
+        parser.add_argument('--concurrency', type=int, default=100, help="Requests in flight")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per scenario and variant")
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append', help="Scenarios to run (default all)")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] > options['users']:
+            # A user's join and leave must not race with its own next round
+            self.stderr.write("--concurrency can't exceed --users")
+            return
+
+        prefix = f'asyncbench_{uuid.uuid4().hex[:8]}'
+        seeds = self.seed(prefix, options['users'])
+        try:
+            with override_settings(
+                ROOT_URLCONF=__name__,
+                DEBUG=False,
+                CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            ):
+                for scenario in options['scenario'] or SCENARIOS:
+                    self.stdout.write(f"{scenario}:")
+                    for variant in ('sync', 'async'):
+                        result = asyncio.run(self.run(variant, scenario, seeds, options))
+                        self.report(variant, result)
+        finally:
+            User.objects.filter(username__startswith=f'{prefix}_').delete()
+            engine = get_queue_engine()
+            if isinstance(engine, OrmQueueEngine):
+                engine.counters.invalidate()
+
+    def seed(self, prefix, count):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}_{i}', nickname=f'{prefix}_{i}') for i in range(count + count % 2)
+        ])
+        tokens = Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in users])
+        sessions = ChatSession.objects.bulk_create([
+            ChatSession(user_a=users[i], user_b=users[i + 1], status='ended', ended_at=timezone.now())
+            for i in range(0, len(users), 2)
+        ])
+        FuseMoment.objects.bulk_create([
+            FuseMoment(session=session, user_a=session.user_a, user_b=session.user_b, summary_text='benchmark')
+            for session in sessions
+        ])
+        return [
+            {'token': token.key, 'session_id': sessions[i // 2].id}
+            for i, token in enumerate(tokens)
+        ][:count]
+
+    async def run(self, variant, scenario, seeds, options):
+        application = get_asgi_application()
+        latency = LatencyMetric(f'{variant}.{scenario}', window=options['requests'] * 2)
+        concurrency = options['concurrency']
+        rounds = max(options['requests'] // concurrency, 1)
+        failures = 0
+
+        async def request(seed, method, url, body):
+            communicator = HttpCommunicator(
+                application, method, f'/{variant}/{url}', body=body,
+                headers=[
+                    (b'host', b'localhost'),
+                    (b'authorization', f"Token {seed['token']}".encode()),
+                    (b'content-type', b'application/json'),
+                ]
+            )
+            started = time.perf_counter()
+            response = await communicator.get_response(timeout=120)
+            latency.observe(time.perf_counter() - started)
+            return response['status']
+
+        async def worker(index):
+            nonlocal failures
+            # Worker i cycles through users i, i + concurrency, ...
+            own = seeds[index::concurrency]
+            for n in range(rounds):
+                seed = own[n % len(own)]
+                for method, url, body in SCENARIOS[scenario](seed):
+                    if await request(seed, method, url, body) >= 400:
+                        failures += 1
+
+        # Warm the token cache and connections so both variants start from steady state
+        await asyncio.gather(*(
+            request(seed, *SCENARIOS['fuse_moments'](seed)[0]) for seed in seeds[:concurrency]
+        ))
+        latency.reset()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {'elapsed': elapsed, 'failures': failures, **latency.snapshot()}
+
+    def report(self, variant, result):
+        self.stdout.write(
+            f"  {variant:>5}: {result['count'] / result['elapsed']:8.1f} req/s, "
+            f"p50 {result['p50_ms']:7.2f} ms, p95 {result['p95_ms']:7.2f} ms, "
+            f"p99 {result['p99_ms']:7.2f} ms, max {result['max_ms']:7.2f} ms"
+            + (f", {result['failures']} failed" if result['failures'] else "")
+        )
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark: encode/decode cost and size per WebSocket frame type for
+stdlib json, the orjson-backed JSON codec and MessagePack.
+"""
+
+import random
+import string
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from fusetalkconfig.codec import JSON, MSGPACK, JsonCodec
+
+
+def sample_sdp(rng, candidates=12):
+    """An SDP offer of realistic size (a few KB) with audio and video sections."""
+    lines = ['v=0', f'o=- {rng.getrandbits(63)} 2 IN IP4 127.0.0.1', 's=-', 't=0 0',
+             'a=group:BUNDLE 0 1', 'a=msid-semantic: WMS']
+    for mid, kind in enumerate(('audio', 'video')):
+        lines += [
+            f'm={kind} 9 UDP/TLS/RTP/SAVPF 111 63 9 0 8 13 110 126' if kind == 'audio'
+            else 'm=video 9 UDP/TLS/RTP/SAVPF 96 97 102 103 104 105 106 107 108 109 127 125',
+            'c=IN IP4 0.0.0.0', 'a=rtcp:9 IN IP4 0.0.0.0',
+            f"a=ice-ufrag:{''.join(rng.choices(string.ascii_letters, k=4))}",
+            f"a=ice-pwd:{''.join(rng.choices(string.ascii_letters, k=24))}",
+            'a=fingerprint:sha-256 ' + ':'.join(f'{rng.getrandbits(8):02X}' for _ in range(32)),
+            'a=setup:actpass', f'a=mid:{mid}', 'a=sendrecv', 'a=rtcp-mux',
+        ]
+        lines += [f'a=rtpmap:{pt} codec{pt}/90000' for pt in range(96, 128)]
+        lines += [f'a=rtcp-fb:{pt} nack pli' for pt in range(96, 112)]
+        lines += [f'a=ssrc:{rng.getrandbits(31)} cname:{uuid.uuid4().hex}' for _ in range(4)]
+        lines += [
+            f'a=candidate:{rng.getrandbits(32)} 1 udp {rng.getrandbits(31)} 192.168.1.{i} '
+            f'{rng.randint(1024, 65535)} typ host generation 0'
+            for i in range(candidates // 2)
+        ]
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def sample_frames(rng):
+    session_id = str(uuid.uuid4())
+    chat_message = {
+        'type': 'chat_message',
+        'session_id': session_id,
+        'content': 'Muraho! How is your day going so far?',
+        'sender': 'curious_otter',
+        'timestamp': timezone.now().isoformat(),
+        'seq': 42,
+    }
+    candidate = {
+        'type': 'ice-candidate',
+        'candidate': {
+            'candidate': f'candidate:{rng.getrandbits(32)} 1 udp 2122260223 192.168.1.7 54321 typ host',
+            'sdpMid': '0',
+            'sdpMLineIndex': 0,
+        },
+    }
+    return {
+        'chat_message': chat_message,
+        'typing_indicator': {'type': 'typing_indicator', 'session_id': session_id,
+                             'user': 'curious_otter', 'is_typing': True},
+        'match_found': {'type': 'match_found', 'session_id': session_id, 'matched_user': 'quiet_heron',
+                        'message': 'Match found! Connected with quiet_heron'},
+        'queue_update': {'type': 'queue_update', 'position': 3, 'message': 'Position in queue: 3'},
+        'signaling_offer': {'type': 'offer', 'offer': {'type': 'offer', 'sdp': sample_sdp(rng)}},
+        'ice_candidate': candidate,
+        'replay_100': {'type': 'replay', 'session_id': session_id, 'complete': True,
+                       'messages': [{**chat_message, 'seq': seq} for seq in range(1, 101)]},
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare frame encode/decode cost across WebSocket codecs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help="Encode/decode rounds per frame")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        frames = sample_frames(random.Random(options['seed']))
+        codecs = [('stdlib', JsonCodec(use_orjson=False)), (JSON.name, JSON), (MSGPACK.name, MSGPACK)]
+        if not JSON.use_orjson:
+            self.stdout.write("orjson is not installed; 'json' falls back to stdlib")
+
+        for frame_type, frame in frames.items():
+            self.stdout.write(f"{frame_type}:")
+            # Fewer rounds for the multi-KB frames so every frame takes similar wall time
+            iterations = max(options['iterations'] * 200 // len(JSON.encode(frame)), 100)
+            iterations = min(iterations, options['iterations'])
+            for name, codec in codecs:
+                self.report(name, codec, frame, iterations)
+
+    def report(self, name, codec, frame, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            encoded = codec.encode(frame)
+        encode_us = (time.perf_counter() - started) / iterations * 1e6
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            decoded = codec.decode(encoded)
+        decode_us = (time.perf_counter() - started) / iterations * 1e6
+
+        assert decoded == frame, f"{name} did not round-trip"
+        self.stdout.write(
+            f"  {name:>8}: {len(encoded):>6} bytes, "
+            f"encode {encode_us:7.2f} us, decode {decode_us:7.2f} us"
+        )
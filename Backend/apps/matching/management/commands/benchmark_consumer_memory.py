@@ -0,0 +1,128 @@
+"""
+Memory benchmark: resident memory per idle MatchingConsumer connection when the
+scope carries a full User instance ('orm', what AuthMiddlewareStack attaches)
+versus a SocketPrincipal ('principal', what TokenAuthMiddleware attaches).
+Each mode runs in a fresh interpreter, since freed memory is rarely returned
+to the OS and would flatter whichever mode ran second. Uses an in-memory
+channel layer and cache; the seeded users are deleted afterwards.
+"""
+
+import asyncio
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import uuid
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from apps.users.principals import SocketPrincipal
+
+User = get_user_model()
+
+MODES = ('orm', 'principal')
+
+
+def resident_bytes() -> int:
+    """Current RSS; falls back to peak RSS where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Command(BaseCommand):
+    help = "Measure resident memory per idle matching socket with ORM users vs compact principals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=20000, help="Idle sockets to open")
+        parser.add_argument('--mode', choices=MODES, help="Measure one mode in this process")
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.measure(options['mode'], options['connections'])))
+            return
+
+        results = {mode: self.run_isolated(mode, options['connections']) for mode in MODES}
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:>9}: {result['connections']} sockets, "
+                f"RSS {result['rss_before'] / 2**20:.1f} -> {result['rss_after'] / 2**20:.1f} MiB, "
+                f"{result['bytes_per_connection']:.0f} bytes/connection"
+            )
+        saved = results['orm']['bytes_per_connection'] - results['principal']['bytes_per_connection']
+        self.stdout.write(f"principal saves {saved:.0f} bytes/connection")
+
+    def run_isolated(self, mode, connections):
+        completed = subprocess.run(
+            [sys.executable, sys.argv[0], 'benchmark_consumer_memory', '--mode', mode,
+             '--connections', str(connections)],
+            capture_output=True, text=True, check=True
+        )
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def measure(self, mode, connections):
+        prefix = f'membench_{uuid.uuid4().hex[:8]}'
+        User.objects.bulk_create([
+            User(username=f'{prefix}_{i}', nickname=f'{prefix}_{i}') for i in range(connections)
+        ])
+        try:
+            with override_settings(
+                CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                MATCH_QUEUE_UPDATE_INTERVAL_MS=0,
+            ):
+                return asyncio.run(self.open_sockets(mode, prefix))
+        finally:
+            User.objects.filter(username__startswith=f'{prefix}_').delete()
+
+    async def open_sockets(self, mode, prefix):
+        from apps.matching.routing import websocket_urlpatterns
+
+        application = URLRouter(websocket_urlpatterns)
+        seeded = User.objects.filter(username__startswith=f'{prefix}_')
+
+        gc.collect()
+        rss_before = resident_bytes()
+
+        # Users are loaded inside the measured window, one object per scope as in production
+        if mode == 'orm':
+            users = await asyncio.to_thread(lambda: list(seeded))
+        else:
+            users = await asyncio.to_thread(lambda: [
+                SocketPrincipal(user_id, nickname) for user_id, nickname in seeded.values_list('id', 'nickname')
+            ])
+
+        communicators = []
+        for user in users:
+            communicator = WebsocketCommunicator(application, '/ws/matching/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise RuntimeError(f"Matching socket refused {user}")
+            communicators.append(communicator)
+        # Only the scopes keep the users alive from here on
+        del users
+
+        gc.collect()
+        rss_after = resident_bytes()
+
+        for communicator in communicators:
+            await communicator.disconnect()
+
+        return {
+            'mode': mode,
+            'connections': len(communicators),
+            'rss_before': rss_before,
+            'rss_after': rss_after,
+            'bytes_per_connection': (rss_after - rss_before) / len(communicators),
+        }
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: "Next" as end-session + join_queue vs the single next_match operation.
+Seeds active sessions inside a transaction that is rolled back afterwards.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.chat.models import ChatSession
+from apps.matching.engines import OrmQueueEngine, get_queue_engine
+from apps.matching.services import MatchingService
+from apps.users.models import User
+
+
+def two_call_next(user, session_id):
+    """The previous flow: end the session, then POST /api/match/join/."""
+    ChatSession.objects.filter(id=session_id, status='active').update(status='ended', ended_at=timezone.now())
+    return MatchingService.join_queue(user, 'music', 'mixed', notify=False)
+
+
+def single_call_next(user, session_id):
+    return MatchingService.next_match(user, 'music', 'mixed', notify=False)
+
+
+class Command(BaseCommand):
+    help = "Compare the two-call and single-operation Next paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=500, help="Active sessions to skip per strategy")
+
+    def handle(self, *args, **options):
+        engine = get_queue_engine()
+
+        with transaction.atomic():
+            strategies = [
+                ('two-call', two_call_next),
+                ('next', single_call_next),
+            ]
+            users = []
+            for name, skip in strategies:
+                sessions = self.seed(name, options['sessions'])
+                users.extend(session.user_a for session in sessions)
+                users.extend(session.user_b for session in sessions)
+                self.report(name, skip, sessions)
+
+            # Queue state outside the database isn't rolled back with the seeded rows
+            for user in users:
+                engine.leave(user)
+            transaction.set_rollback(True)
+
+        if isinstance(engine, OrmQueueEngine):
+            engine.counters.invalidate()
+
+    def seed(self, name, count):
+        users = User.objects.bulk_create([
+            User(username=f'bench_{name}_{i}', nickname=f'bench_{name}_{i}') for i in range(count * 2)
+        ])
+        return ChatSession.objects.bulk_create([
+            ChatSession(
+                user_a=users[i * 2],
+                user_b=users[i * 2 + 1],
+                topic_tag='music',
+                status='active',
+                started_at=timezone.now()
+            )
+            for i in range(count)
+        ])
+
+    def report(self, name, skip, sessions):
+        timings = []
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            for session in sessions:
+                started = time.perf_counter()
+                skip(session.user_a, session.id)
+                timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            f"{name:>8}: {queries / len(sessions):.2f} queries/next, "
+            f"avg {sum(timings) / len(timings) * 1000:.3f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95)] * 1000:.3f} ms"
+        )
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark: legacy priority cascade vs single-query ranked partner selection.
+Seeds waiting sessions inside a transaction that is rolled back afterwards.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.chat.models import ChatSession
+from apps.matching.models import MatchQueue, LANGUAGE_CHOICES
+from apps.matching.services import MatchingService
+from apps.users.models import User
+
+VIBE_TAGS = [tag for tag, _ in MatchQueue.VIBE_TAG_CHOICES]
+LANGUAGES = [lang for lang, _ in LANGUAGE_CHOICES]
+
+
+def legacy_find_waiting_session(vibe_tag, language, is_visitor, exclude_user):
+    """The previous three-query cascade with the language check done in Python."""
+    waiting_sessions = MatchingService._waiting_sessions(exclude_user).select_for_update()
+
+    if vibe_tag != 'random':
+        session = waiting_sessions.filter(topic_tag=vibe_tag).first()
+        if session and MatchingService._is_language_compatible(language, session.language):
+            return session
+
+    session = waiting_sessions.filter(topic_tag='random').first()
+    if session and MatchingService._is_language_compatible(language, session.language):
+        return session
+
+    session = waiting_sessions.first()
+    if session and MatchingService._is_language_compatible(language, session.language):
+        return session
+
+    return None
+
+
+class Command(BaseCommand):
+    help = "Compare legacy and ranked partner selection over a seeded waiting pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Waiting sessions to seed")
+        parser.add_argument('--lookups', type=int, default=200, help="Partner lookups per strategy")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            users = self.seed(options['rows'], rng)
+            lookups = [
+                (rng.choice(VIBE_TAGS), rng.choice(LANGUAGES), rng.random() < 0.3, rng.choice(users))
+                for _ in range(options['lookups'])
+            ]
+
+            strategies = [
+                ('legacy', legacy_find_waiting_session),
+                ('ranked', MatchingService._find_waiting_session),
+            ]
+            for name, find in strategies:
+                self.report(name, find, lookups)
+
+            # Never keep the seeded rows
+            transaction.set_rollback(True)
+
+    def seed(self, rows, rng):
+        users = User.objects.bulk_create([
+            User(username=f'bench_{i}', nickname=f'bench_{i}') for i in range(rows)
+        ])
+        ChatSession.objects.bulk_create([
+            ChatSession(
+                user_a=user,
+                topic_tag=rng.choice(VIBE_TAGS),
+                language=rng.choice(LANGUAGES),
+                is_visitor=rng.random() < 0.3,
+                status='waiting'
+            )
+            for user in users
+        ])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE chat_sessions')
+        return users
+
+    def report(self, name, find, lookups):
+        misses = 0
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for vibe_tag, language, is_visitor, user in lookups:
+                started = time.perf_counter()
+                session = find(vibe_tag, language, is_visitor, user)
+                timings.append(time.perf_counter() - started)
+                # Every lookup has compatible candidates in a pool this size
+                if session is None:
+                    misses += 1
+
+        timings.sort()
+        self.stdout.write(
+            f"{name:>7}: {len(queries) / len(lookups):.2f} queries/lookup, "
+            f"avg {sum(timings) / len(timings) * 1000:.3f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95)] * 1000:.3f} ms, "
+            f"missed {misses}/{len(lookups)}"
+        )
@@ -0,0 +1,182 @@
+"""
+Load test: Postgres backend count and p99 latency as the socket count grows.
+Each simulated client holds a /ws/matching/ socket and, per round, sends a
+queue leave over it (a database_sync_to_async call) and fetches
+/api/chat/fuse-moments/ through Django's ASGI handler (a request thread).
+pg_stat_activity is sampled throughout each step. Run it once with
+DB_POOL_ENABLED=True (and CONN_MAX_AGE 0) and once without to compare the
+pooled backend with per-thread connections. Seeded users are deleted afterwards.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import psycopg2
+from channels.routing import URLRouter
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from apps.users.models import User
+from fusetalkconfig.metrics import LatencyMetric, get_metric
+
+BACKENDS_SQL = (
+    "SELECT count(*) FROM pg_stat_activity "
+    "WHERE datname = current_database() AND backend_type = 'client backend' AND pid <> pg_backend_pid()"
+)
+
+
+class BackendSampler:
+    """Peak client backends on the database, polled from a connection outside the pool."""
+
+    def __init__(self, conn_params: dict, interval: float = 0.05):
+        self.conn_params = conn_params
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        sampler = psycopg2.connect(**self.conn_params)
+        sampler.autocommit = True
+        try:
+            with sampler.cursor() as cursor:
+                while not self._stop.is_set():
+                    cursor.execute(BACKENDS_SQL)
+                    self.peak = max(self.peak, cursor.fetchone()[0])
+                    self._stop.wait(self.interval)
+        finally:
+            sampler.close()
+
+
+class Command(BaseCommand):
+    help = "Measure Postgres backends and p99 latency while ramping up sockets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', default='100,250,500,1000',
+                            help="Comma-separated socket counts, one step each")
+        parser.add_argument('--rounds', type=int, default=5, help="Leave + REST round trips per socket per step")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("loadtest_db_pool counts pg_stat_activity backends and needs PostgreSQL")
+
+        steps = [int(count) for count in options['sockets'].split(',')]
+        prefix = f'pooltest_{uuid.uuid4().hex[:8]}'
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}_{i}', nickname=f'{prefix}_{i}') for i in range(max(steps))
+        ])
+        tokens = [
+            token.key for token in
+            Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in users])
+        ]
+        conn_params = connection.get_connection_params()
+        # Nothing from this thread should count against the pool while the steps run
+        connection.close()
+
+        report = {
+            'engine': connection.settings_dict['ENGINE'],
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'steps': [],
+        }
+        try:
+            with override_settings(
+                CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                MATCH_QUEUE_UPDATE_INTERVAL_MS=0,
+                DEBUG=False,
+            ):
+                for sockets in steps:
+                    with BackendSampler(conn_params) as sampler:
+                        step = asyncio.run(self.run_step(tokens[:sockets], options['rounds']))
+                    step['peak_backends'] = sampler.peak
+                    report['steps'].append(step)
+                    self.report(step)
+        finally:
+            User.objects.filter(username__startswith=f'{prefix}_').delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(f"Saved report to {options['output']}")
+
+    async def run_step(self, tokens, rounds):
+        from fusetalkconfig.asgi import TokenAuthMiddleware
+        from apps.matching.routing import websocket_urlpatterns
+
+        websocket_app = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+        http_app = get_asgi_application()
+        socket_latency = LatencyMetric('loadtest.socket_leave', window=len(tokens) * rounds)
+        http_latency = LatencyMetric('loadtest.http_fuse_moments', window=len(tokens) * rounds)
+        pool_wait = get_metric('db.pool.default.wait')
+        pool_wait.reset()
+        errors = 0
+
+        communicators = []
+        for token in tokens:
+            communicator = WebsocketCommunicator(websocket_app, f'/ws/matching/?token={token}')
+            connected, _ = await communicator.connect(timeout=30)
+            if not connected:
+                raise CommandError("Matching socket refused a seeded user")
+            communicators.append(communicator)
+
+        async def client(communicator, token):
+            nonlocal errors
+            for _ in range(rounds):
+                started = time.perf_counter()
+                await communicator.send_json_to({'type': 'leave'})
+                reply = await communicator.receive_json_from(timeout=60)
+                socket_latency.observe(time.perf_counter() - started)
+                errors += reply['type'] != 'leave_ack'
+
+                request = HttpCommunicator(
+                    http_app, 'GET', '/api/chat/fuse-moments/',
+                    headers=[(b'host', b'localhost'), (b'authorization', f'Token {token}'.encode())]
+                )
+                started = time.perf_counter()
+                response = await request.get_response(timeout=60)
+                http_latency.observe(time.perf_counter() - started)
+                errors += response['status'] != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(communicator, token) for communicator, token in zip(communicators, tokens)))
+        elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            await communicator.disconnect()
+
+        return {
+            'sockets': len(tokens),
+            'operations': len(tokens) * rounds * 2,
+            'ops_per_second': len(tokens) * rounds * 2 / elapsed,
+            'errors': errors,
+            'socket_leave': socket_latency.snapshot(),
+            'http_fuse_moments': http_latency.snapshot(),
+            'pool_wait': pool_wait.snapshot(),
+        }
+
+    def report(self, step):
+        self.stdout.write(
+            f"{step['sockets']:>6} sockets: {step['peak_backends']:>4} backends, "
+            f"{step['ops_per_second']:8.1f} ops/s, "
+            f"socket p99 {step['socket_leave']['p99_ms']:7.2f} ms, "
+            f"http p99 {step['http_fuse_moments']['p99_ms']:7.2f} ms, "
+            f"pool wait p99 {step['pool_wait']['p99_ms']:6.2f} ms"
+            + (f", {step['errors']} errors" if step['errors'] else "")
+        )
@@ -0,0 +1,77 @@
+"""
+Load-test the match queue and save the results as JSON.
+Runs against the configured database and queue engine with an in-memory
+channel layer; use a local Postgres for numbers worth comparing.
+"""
+
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.matching.loadtest import MODES, MatchingLoadTest
+
+
+class Command(BaseCommand):
+    help = "Drive simulated users through the match queue and report latency and integrity"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Simulated users")
+        parser.add_argument('--concurrency', type=int, default=20, help="Joins in flight at once")
+        parser.add_argument('--mode', choices=MODES, default='service',
+                            help="Join through MatchingService or the /ws/matching/ consumer")
+        parser.add_argument('--parallel', action='store_true',
+                            help="Run service-mode joins on a thread pool to exercise lock contention")
+        parser.add_argument('--vibe-tag', action='append', dest='vibe_tags',
+                            help="Restrict users to these vibe tags (repeatable)")
+        parser.add_argument('--language', default='mixed')
+        parser.add_argument('--timeout', type=float, default=10.0,
+                            help="Seconds to wait for outstanding match_found events")
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        load_test = MatchingLoadTest(
+            users=options['users'],
+            mode=options['mode'],
+            concurrency=options['concurrency'],
+            vibe_tags=options['vibe_tags'],
+            language=options['language'],
+            parallel=options['parallel'],
+            timeout=options['timeout'],
+            seed=options['seed']
+        )
+
+        # Notifications stay in-process so only the queue itself is measured
+        with override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            MATCH_QUEUE_UPDATE_INTERVAL_MS=0,
+        ):
+            report = load_test.run()
+
+        # Tag the run so reports from different commits can be compared
+        report = {'revision': self.revision(), 'ran_at': timezone.now().isoformat(), **report}
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(f"Saved report to {options['output']}")
+        self.stdout.write(output)
+
+        if report['double_matches'] or report['lost_users']:
+            self.stderr.write(self.style.ERROR(
+                f"Integrity failure: {report['double_matches']} double matches, "
+                f"{report['lost_users']} lost users"
+            ))
+
+    @staticmethod
+    def revision():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
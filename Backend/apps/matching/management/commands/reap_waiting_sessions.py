@@ -0,0 +1,37 @@
+"""
+End waiting sessions and queue entries whose owner has gone away.
+"""
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from apps.matching.reaper import reap_once, run_forever
+
+
+class Command(BaseCommand):
+    help = "Periodically evict waiting users with no open matching socket"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.MATCH_REAPER_INTERVAL_SECONDS,
+            help="Seconds between sweeps (default: MATCH_REAPER_INTERVAL_SECONDS)"
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Run a single sweep and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            reaped = reap_once()
+            self.stdout.write(f"Reaped {reaped} waiting entries")
+            return
+
+        self.stdout.write(f"Reaping stale waiting entries every {options['interval']} s")
+        try:
+            run_forever(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
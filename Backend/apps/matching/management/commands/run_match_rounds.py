@@ -0,0 +1,38 @@
+"""
+Run batch matchmaking rounds.
+Use together with MATCH_ROUNDS_ENABLED=True so joins only enqueue.
+"""
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from apps.matching.rounds import run_forever, run_round
+
+
+class Command(BaseCommand):
+    help = "Pair everyone waiting in the match queue once per tick"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tick-ms',
+            type=int,
+            default=settings.MATCH_ROUND_TICK_MS,
+            help="Round length in milliseconds (default: MATCH_ROUND_TICK_MS)"
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Run a single round and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            created = run_round()
+            self.stdout.write(f"Created {created} sessions")
+            return
+
+        self.stdout.write(f"Running matching rounds every {options['tick_ms']} ms")
+        try:
+            run_forever(options['tick_ms'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
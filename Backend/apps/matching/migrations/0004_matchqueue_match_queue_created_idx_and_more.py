@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matching', '0003_alter_matchqueue_language'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchqueue',
+            index=models.Index(fields=['created_at'], name='match_queue_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchqueue',
+            index=models.Index(fields=['vibe_tag', 'created_at'], name='match_queue_vibe_idx'),
+        ),
+    ]
@@ -2,6 +2,13 @@ import uuid
 from django.db import models
 from django.conf import settings
 
+LANGUAGE_CHOICES = [
+    ('kinyarwanda', 'Kinyarwanda'),
+    ('english', 'English'),
+    ('french', 'French'),
+    ('mixed', 'Mixed'),
+]
+
 class MatchQueue(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -23,3 +30,7 @@ class MatchQueue(models.Model):
     class Meta:
         db_table = 'match_queue'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='match_queue_created_idx'),
+            models.Index(fields=['vibe_tag', 'created_at'], name='match_queue_vibe_idx'),
+        ]
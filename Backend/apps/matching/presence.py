@@ -0,0 +1,80 @@
+"""
+Matching socket presence.
+Open MatchingConsumer connections are counted per user in the cache, in
+buckets of half MATCH_PRESENCE_TTL_SECONDS. Each socket counts itself once in
+every bucket it sends a heartbeat in, and a user is online while the current
+or previous bucket has a count. A worker that dies without running disconnect
+can't keep its users online for longer than the TTL, and since every live
+socket counts itself again in the next bucket, an expired or evicted counter
+never loses the user's other sockets.
+"""
+
+import time
+from typing import Iterable, List, Set
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRESENCE_PREFIX = 'matchq:presence'
+
+
+def presence_key(user_id, bucket: int) -> str:
+    return f'{PRESENCE_PREFIX}:{user_id}:{bucket}'
+
+
+def current_bucket() -> int:
+    # Heartbeats must come more often than this for every live socket to be counted in each bucket
+    return int(time.time() // (settings.MATCH_PRESENCE_TTL_SECONDS / 2))
+
+
+def _count(user_id, bucket: int):
+    key = presence_key(user_id, bucket)
+    # The bucket is read until the end of the next one, at most a full TTL after it starts
+    ttl = settings.MATCH_PRESENCE_TTL_SECONDS
+    cache.add(key, 0, timeout=ttl)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, timeout=ttl)
+
+
+def connected(user_id) -> List[int]:
+    """Record a newly opened matching socket for the user. Returns the buckets it is counted in."""
+    bucket = current_bucket()
+    _count(user_id, bucket)
+    return [bucket]
+
+
+def heartbeat(user_id, buckets: List[int]) -> List[int]:
+    """Keep the socket counted; returns the buckets it is now counted in."""
+    bucket = current_bucket()
+    if bucket not in buckets:
+        _count(user_id, bucket)
+        buckets = buckets + [bucket]
+    # Older buckets no longer decide whether the user is online
+    return [counted for counted in buckets if counted >= bucket - 1]
+
+
+def disconnected(user_id, buckets: List[int]) -> bool:
+    """Record a closed matching socket. Returns True if the user has none left open."""
+    bucket = current_bucket()
+    for counted in buckets:
+        if counted >= bucket - 1:
+            try:
+                cache.decr(presence_key(user_id, counted))
+            except ValueError:
+                pass
+    return not online_user_ids([user_id])
+
+
+def online_user_ids(user_ids: Iterable) -> Set[str]:
+    """The subset of user_ids with at least one open matching socket."""
+    bucket = current_bucket()
+    keys = {
+        presence_key(user_id, counted): str(user_id)
+        for user_id in user_ids for counted in (bucket - 1, bucket)
+    }
+    if not keys:
+        return set()
+    return {keys[key] for key, count in cache.get_many(list(keys)).items() if count > 0}
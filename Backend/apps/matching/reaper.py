@@ -0,0 +1,47 @@
+"""
+Stale waiting-entry reaper.
+Sockets normally evict their owner's waiting entry on disconnect; this sweep
+catches what that misses (crashed workers, REST-only joins that never
+connected) by ending entries whose owner has had no open matching socket
+for longer than the presence grace period.
+"""
+
+import logging
+import time
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .engines import get_queue_engine
+
+logger = logging.getLogger(__name__)
+
+
+def reap_once(engine=None) -> int:
+    """Run one bounded sweep. Returns the number of waiting entries evicted."""
+    engine = engine or get_queue_engine()
+    cutoff = timezone.now() - timedelta(seconds=settings.MATCH_PRESENCE_GRACE_SECONDS)
+    reaped = engine.reap_stale(
+        cutoff,
+        batch_size=settings.MATCH_REAPER_BATCH_SIZE,
+        max_batches=settings.MATCH_REAPER_MAX_BATCHES
+    )
+    if reaped:
+        logger.info(f"Reaped {reaped} stale waiting entries")
+    return reaped
+
+
+def run_forever(interval_seconds: Optional[int] = None):
+    """Sweep on a fixed interval until interrupted."""
+    interval = interval_seconds or settings.MATCH_REAPER_INTERVAL_SECONDS
+    engine = get_queue_engine()
+
+    while True:
+        started = time.monotonic()
+        try:
+            reap_once(engine)
+        except Exception as e:
+            logger.error(f"Waiting-entry reaper failed: {str(e)}")
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
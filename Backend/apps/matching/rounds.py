@@ -0,0 +1,164 @@
+"""
+Batch matchmaking rounds.
+Instead of greedily pairing each arrival with the oldest waiting session,
+a round snapshots the whole pool, scores every compatible pair and writes
+all resulting sessions and notifications in one go.
+"""
+
+import logging
+import time
+from collections import defaultdict, deque
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from apps.chat.models import ChatSession
+from .engines import QueueEntry, get_queue_engine
+from .services import MatchingService
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Scoring weights
+SAME_VIBE_SCORE = 4.0
+RANDOM_VIBE_SCORE = 2.0
+VISITOR_LOCAL_SCORE = 3.0
+EXACT_LANGUAGE_SCORE = 1.0
+WAIT_SCORE_PER_SECOND = 0.2
+MAX_WAIT_SCORE = 6.0
+
+
+def score_pair(a: QueueEntry, b: QueueEntry, now: float) -> Optional[float]:
+    """
+    Score how good a pairing is, or None if the two can't be matched.
+    Rewards shared vibe tags, visitor/local pairs and long combined waits.
+    """
+    if not MatchingService._is_language_compatible(a.language, b.language):
+        return None
+
+    score = 0.0
+    if a.vibe_tag == b.vibe_tag and a.vibe_tag != 'random':
+        score += SAME_VIBE_SCORE
+    elif 'random' in (a.vibe_tag, b.vibe_tag):
+        score += RANDOM_VIBE_SCORE
+
+    if a.language == b.language:
+        score += EXACT_LANGUAGE_SCORE
+
+    # Visitors are here to meet locals
+    if a.is_visitor != b.is_visitor:
+        score += VISITOR_LOCAL_SCORE
+
+    waited = (now - a.enqueued_at) + (now - b.enqueued_at)
+    score += min(waited * WAIT_SCORE_PER_SECOND, MAX_WAIT_SCORE)
+    return score
+
+
+def pair_pool(entries: List[QueueEntry], now: Optional[float] = None) -> List[Tuple[QueueEntry, QueueEntry]]:
+    """
+    Pair the pool in one pass. Users are served oldest first, each taking
+    their best-scoring partner among those still unpaired.
+    Within a (vibe, language, visitor) bucket candidates differ only in how long
+    they have waited, which never lowers the score, so the oldest in each bucket
+    is the best there: each user scores one head per bucket, not the whole pool.
+    """
+    now = now or time.time()
+    ordered = sorted(entries, key=lambda entry: entry.enqueued_at)
+    buckets = defaultdict(deque)
+    for entry in ordered:
+        buckets[(entry.vibe_tag, entry.language, entry.is_visitor)].append(entry)
+
+    taken = set()
+    pairs = []
+    for current in ordered:
+        if id(current) in taken:
+            continue
+        # The oldest unpaired user heads their own bucket
+        buckets[(current.vibe_tag, current.language, current.is_visitor)].popleft()
+        taken.add(id(current))
+
+        best, best_bucket, best_score = None, None, None
+        for bucket in buckets.values():
+            candidate = next((entry for entry in bucket if entry.user_id != current.user_id), None)
+            if candidate is None:
+                continue
+            score = score_pair(current, candidate, now)
+            if score is None:
+                continue
+            # Ties go to the longer wait, as in a scan of the whole pool
+            if best_score is None or score > best_score or (
+                score == best_score and candidate.enqueued_at < best.enqueued_at
+            ):
+                best, best_bucket, best_score = candidate, bucket, score
+        if best is not None:
+            best_bucket.remove(best)
+            taken.add(id(best))
+            pairs.append((current, best))
+
+    return pairs
+
+
+def run_round(engine=None) -> int:
+    """Run one matching round. Returns the number of sessions created."""
+    engine = engine or get_queue_engine()
+    entries = engine.waiting(limit=settings.MATCH_ROUND_MAX_POOL)
+    if len(entries) < 2:
+        return 0
+
+    pairs = pair_pool(entries)
+    users = {
+        str(user_id): user for user_id, user in User.objects.only('id', 'nickname').in_bulk(
+            [user_id for pair in pairs for user_id in (pair[0].user_id, pair[1].user_id)]
+        ).items()
+    }
+    # Deleted accounts are left for the reaper rather than claimed
+    pairs = [(a, b) for a, b in pairs if a.user_id in users and b.user_id in users]
+
+    # ORM claims roll back with the insert; Redis claims are put back by hand
+    with transaction.atomic():
+        claimed = set(engine.claim_pairs([(a.user_id, b.user_id) for a, b in pairs]))
+        pairs = [(a, b) for a, b in pairs if (a.user_id, b.user_id) in claimed]
+        if not pairs:
+            return 0
+
+        started_at = timezone.now()
+        try:
+            sessions = ChatSession.objects.bulk_create([
+                ChatSession(
+                    # The longer-waiting user becomes user_a, as in the greedy path
+                    user_a=users[a.user_id],
+                    user_b=users[b.user_id],
+                    topic_tag=a.vibe_tag if a.vibe_tag != 'random' else b.vibe_tag,
+                    language=a.language if a.language != 'mixed' else b.language,
+                    status='active',
+                    started_at=started_at
+                )
+                for a, b in pairs
+            ])
+        except Exception:
+            for pair in pairs:
+                for entry in pair:
+                    engine.restore(entry)
+            raise
+
+        MatchingService._notify_matches(sessions)
+
+    logger.info(f"Matching round paired {len(sessions)} sessions from a pool of {len(entries)}")
+    return len(sessions)
+
+
+def run_forever(tick_ms: Optional[int] = None):
+    """Run matching rounds on a fixed tick until interrupted."""
+    tick = (tick_ms or settings.MATCH_ROUND_TICK_MS) / 1000
+    engine = get_queue_engine()
+
+    while True:
+        started = time.monotonic()
+        try:
+            run_round(engine)
+        except Exception as e:
+            logger.error(f"Matching round failed: {str(e)}")
+        time.sleep(max(0.0, tick - (time.monotonic() - started)))
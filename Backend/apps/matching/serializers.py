@@ -4,7 +4,7 @@ Following DRF best practices for clean API design.
 """
 
 from rest_framework import serializers
-from .models import MatchQueue
+from .models import MatchQueue, LANGUAGE_CHOICES
 
 class JoinQueueSerializer(serializers.Serializer):
     """Serializer for joning the match Queue."""
@@ -16,12 +16,7 @@ class JoinQueueSerializer(serializers.Serializer):
         )
     
     language = serializers.ChoiceField(
-        choices=[
-            ('kinyarwanda', "Kinyarwanda"),
-            ('english', 'English'),
-            ('french', 'French'),
-            ('mixed', 'Mixed')
-        ],
+        choices=LANGUAGE_CHOICES,
         default='mixed',
         help_text="Language preference"
     )
@@ -39,10 +34,12 @@ class MatchResponseSerializer(serializers.Serializer):
     matched_user = serializers.CharField(max_length=50, required=False)
     queue_position = serializers.IntegerField(required=False)
     message = serializers.CharField(max_length=200, required=False)
+    ended_session_ids = serializers.ListField(child=serializers.UUIDField(), required=False)
 
 class QueueStatsSerializer(serializers.Serializer):
     """Serializer for queue statistics."""
 
     total_waiting = serializers.IntegerField()
     by_vibe_tag = serializers.DictField()
+    by_language = serializers.DictField()
     visitors_waiting = serializers.IntegerField()
\ No newline at end of file
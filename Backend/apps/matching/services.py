@@ -1,12 +1,17 @@
 """ Matching service layer - handles all macthing business logic.
 This follows the Service Layer pattern for clean architecture."""
 
+import asyncio
 import logging
-from typing import Optional, Tuple
-from django.db import transaction, models
+from typing import List, Optional, Tuple
+from django.conf import settings
+from django.db import connection, transaction, models
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from fusetalkconfig.metrics import snapshot_all
 from .models import MatchQueue
+from .stats import cached_snapshot
+from apps.chat.access import invalidate_sessions
 from apps.chat.models import ChatSession
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
@@ -20,34 +25,6 @@ class MatchingService:
     Handles queue management and user pairing algorithm.
     """
     
-    @staticmethod
-    def _find_match(vibe_tag: str, language: str, is_visitor: bool) -> Optional[MatchQueue]:
-        """
-        Find a compatible user in the queue. Matching algorithm prioritizes:
-        1. Same vibe tag OR random
-        2. Compatible language
-        3. Visitor/local pairing preference
-        """
-        base_queue = MatchQueue.objects.select_related('user')
-
-        # Priority 1: Exact vibe tag match
-        if vibe_tag != 'random':
-            match = base_queue.filter(vibe_tag=vibe_tag).first()
-            if match and MatchingService._is_language_compatible(language, match.language):
-                return match
-        
-        # Priority 2: Random tag users (always compatible)
-        match = base_queue.filter(vibe_tag='random').first()
-        if match and MatchingService._is_language_compatible(language, match.language):
-            return match
-        
-        # Priority 3: Any compatible language match
-        for queue_entry in base_queue.all():
-            if MatchingService._is_language_compatible(language, queue_entry.language):
-                return queue_entry
-            
-        return None
-        
     @staticmethod
     def _is_language_compatible(lang1: str, lang2: str) -> bool:
         """ Check if two language preferences are compatible. """
@@ -75,9 +52,9 @@ class MatchingService:
     @staticmethod
     def leave_queue(user: User) -> bool:
         """Remove user from matching queue."""
-        delete_count, _ = MatchQueue.objects.filter(user=user).delete()
+        from .engines import get_queue_engine
 
-        if delete_count > 0:
+        if get_queue_engine().leave(user):
             logger.info(f"User {user.nickname} left queue")
             return True
         return False 
@@ -86,26 +63,24 @@ class MatchingService:
     @staticmethod
     def get_queue_stats() -> dict:
         """Get current queue statistics (for admin/monitoring)."""
-        return {
-            'total_waiting': MatchQueue.objects.count(),
-            'by_vibe_tag': dict(
-                MatchQueue.objects.values_list('vibe_tag').annotate(count=models.Count('id'))   
-            ),
-            'visitors_waiting': MatchQueue.objects.filter(is_visitor=True).count()
-        }
+        from .engines import get_queue_engine
+
+        # Engines keep incremental counters; the snapshot is cached on top of that
+        return cached_snapshot(get_queue_engine().stats)
     
     @staticmethod
     def join_queue(user: User, vibe_tag: str = 'random', 
-               language: str = 'mixed', is_visitor: bool = False) -> dict:
+               language: str = 'mixed', is_visitor: bool = False, notify: bool = True) -> dict:
+        """
+        Pair the user or put them in the queue.
+        Async callers pass notify=False and send the match_found events themselves.
+        """
+        from .engines import get_queue_engine
+
+        engine = get_queue_engine()
         with transaction.atomic():
-            # Remove user from any existing queue entries
-            MatchQueue.objects.filter(user=user).delete()
-            
-            # End any existing waiting sessions for this user (CRITICAL FIX)
-            ChatSession.objects.filter(
-                user_a=user, 
-                status='waiting'
-            ).update(status='ended', ended_at=timezone.now())
+            # Remove user from any existing queue entries / waiting sessions (CRITICAL FIX)
+            engine.discard(user)
             
             # Also end sessions where user is user_b (NEW FIX)
             ChatSession.objects.filter(
@@ -113,92 +88,231 @@ class MatchingService:
                 status__in=['waiting', 'active']
             ).update(status='ended', ended_at=timezone.now())
 
-            # Find existing waiting session (with exclude_user fix)
-            waiting_session = MatchingService._find_waiting_session(vibe_tag, language, is_visitor, user)
+        # Pairing (or enqueueing) is delegated to the configured queue engine
+        if settings.MATCH_ROUNDS_ENABLED:
+            # Batch mode: the next matching round pairs the whole pool
+            return engine.enqueue(user, vibe_tag, language, is_visitor)
+        return engine.join(user, vibe_tag, language, is_visitor, notify=notify)
+
+    @staticmethod
+    def next_match(user: User, vibe_tag: str = 'random', language: str = 'mixed',
+                   is_visitor: bool = False, notify: bool = True) -> dict:
+        """
+        "Next": end the user's current session and rejoin the queue in one transaction.
+        Peers get a session_ended event on their chat group once it commits.
+        Async callers pass notify=False and send both kinds of events themselves.
+        """
+        from .engines import get_queue_engine
+
+        engine = get_queue_engine()
+        with transaction.atomic():
+            # One locking read and one UPDATE replace join_queue's separate cleanup passes
+            current = ChatSession.objects.select_for_update().filter(
+                models.Q(user_a=user) | models.Q(user_b=user),
+                status__in=['waiting', 'active']
+            )
+            sessions = list(current.values_list('id', 'status'))
 
-            if waiting_session:
-                # Join existing session
-                waiting_session.user_b = user
-                waiting_session.status = 'active'
-                waiting_session.started_at = timezone.now()
-                waiting_session.save()
+            if settings.MATCH_ROUNDS_ENABLED or any(status == 'waiting' for _, status in sessions):
+                # A leftover queue entry goes through the engine so its counters stay right
+                engine.discard(user)
 
-                # Notify both users
-                MatchingService._notify_match_found(waiting_session.user_a, user, waiting_session)
+            ended = [str(session_id) for session_id, status in sessions if status == 'active']
+            if ended:
+                ChatSession.objects.filter(id__in=ended).update(status='ended', ended_at=timezone.now())
+                MatchingService._invalidate_access_on_commit(ended)
+                if notify:
+                    MatchingService._send_on_commit(MatchingService._session_ended_messages(ended, user))
 
-                logger.info(f"Match found: {user.nickname} <-> {waiting_session.user_a.nickname}")
+            if settings.MATCH_ROUNDS_ENABLED:
+                result = engine.enqueue(user, vibe_tag, language, is_visitor)
+            else:
+                result = engine.join(user, vibe_tag, language, is_visitor, notify=notify)
 
-                return {
-                    'status': 'matched',
-                    'session_id': str(waiting_session.id),
-                    'matched_user': waiting_session.user_a.nickname
-                }
-            
-            # No waiting session found, create new waiting session
-            session = ChatSession.objects.create(
-                user_a=user,
-                topic_tag=vibe_tag,
-                language=language,
-                status='waiting'
-            )
+        logger.info(f"User {user.nickname} skipped to next ({len(ended)} session(s) ended)")
 
-            logger.info(f"User {user.nickname} created waiting session")
+        result['ended_session_ids'] = ended
+        return result
 
-            return {
-                'status': 'queued',
-                'session_id': str(session.id),
-                'queue_position': 1
-            }
+    @staticmethod
+    def _session_ended_messages(session_ids: List[str], user: User) -> List[Tuple[str, dict]]:
+        """Build the session_ended (group, message) pair for each ended chat session."""
+        return [
+            (f'chat_{session_id}', {
+                'type': 'session_ended',
+                'session_id': session_id,
+                'ended_by': user.nickname,
+                'reason': 'next'
+            })
+            for session_id in session_ids
+        ]
 
     @staticmethod
-    def _find_waiting_session(vibe_tag: str, language: str, is_visitor: bool, exclude_user: User) -> Optional[ChatSession]:
-        waiting_sessions = ChatSession.objects.filter(
+    def _waiting_sessions(exclude_user: User):
+        """Open waiting sessions, oldest first (served by the chat_waiting_* partial indexes)."""
+        return ChatSession.objects.filter(
             status='waiting',
             user_b__isnull=True
-        ).exclude(user_a=exclude_user).select_for_update().order_by('created_at')
-
-        # Priority 1: Exact vibe match
-        if vibe_tag != 'random':
-            session = waiting_sessions.filter(topic_tag=vibe_tag).first()
-            if session and MatchingService._is_language_compatible(language, session.language):
-                return session
-        
-        # Priority 2: Random sessions
-        session = waiting_sessions.filter(topic_tag='random').first()
-        if session and MatchingService._is_language_compatible(language, session.language):
-            return session
-        
-        # Priority 3: Any compatible session
-        session = waiting_sessions.first()
-        if session and MatchingService._is_language_compatible(language, session.language):
-            return session
-                
-        return None
+        ).exclude(user_a=exclude_user).order_by('created_at')
+
+    @staticmethod
+    def _vibe_tiers(vibe_tag: str) -> List[models.Q]:
+        """Topic filters for partner candidates, best first: same vibe tag, then random, then any other."""
+        tiers = [models.Q(topic_tag=vibe_tag)] if vibe_tag != 'random' else []
+        tiers.append(models.Q(topic_tag='random'))
+        tiers.append(~models.Q(topic_tag__in=[vibe_tag, 'random']))
+        return tiers
 
+    @staticmethod
+    def _waiting_session_sql(vibe_tag: str, language: str, is_visitor: bool, exclude_user: User) -> Tuple[str, list]:
+        """
+        One statement picking the best compatible waiting session, ranked by:
+        1. Same vibe tag, then random, then any other tag
+        2. Exact language before the other compatible one
+        3. Visitor/local pairing preference
+        4. Longest waiting
+        Each rank group reads only its few oldest rows off a chat_waiting_*
+        index (LIMIT per UNION ALL branch); just those are sorted and locked.
+        An ORDER BY CASE over the waiting set would sort every row per join.
+        """
+        waiting_sessions = MatchingService._waiting_sessions(exclude_user)
+        if language == 'mixed':
+            language_groups = [models.Q(language='mixed'), ~models.Q(language='mixed')]
+        else:
+            language_groups = [models.Q(language=language), models.Q(language='mixed')]
+        visitor_groups = [models.Q(is_visitor=not is_visitor), models.Q(is_visitor=is_visitor)]
+
+        branches, params = [], []
+        for tier, vibe_filter in enumerate(MatchingService._vibe_tiers(vibe_tag)):
+            for language_rank, language_filter in enumerate(language_groups):
+                for visitor_rank, visitor_filter in enumerate(visitor_groups):
+                    group = waiting_sessions.filter(vibe_filter, language_filter, visitor_filter).annotate(
+                        tier=models.Value(tier),
+                        language_rank=models.Value(language_rank),
+                        visitor_rank=models.Value(visitor_rank),
+                    ).values('id', 'created_at', 'tier', 'language_rank', 'visitor_rank')
+                    group_sql, group_params = group[:settings.MATCH_CANDIDATES_PER_GROUP].query.sql_with_params()
+                    branches.append(f'SELECT * FROM ({group_sql}) AS group_{len(branches)}')
+                    params.extend(group_params)
+
+        table = connection.ops.quote_name(ChatSession._meta.db_table)
+        sql = (
+            f'SELECT {table}.* FROM {table} '
+            f'INNER JOIN ({" UNION ALL ".join(branches)}) AS candidates ON candidates.id = {table}.id '
+            # Re-checked against the locked row if a concurrent joiner claimed it first
+            f'WHERE {table}.status = %s AND {table}.user_b_id IS NULL '
+            'ORDER BY candidates.tier, candidates.language_rank, candidates.visitor_rank, candidates.created_at '
+            'LIMIT 1'
+        )
+        params.append('waiting')
+        if connection.features.has_select_for_update_skip_locked:
+            # SKIP LOCKED spreads concurrent joiners over different waiting sessions
+            sql += f' FOR UPDATE OF {table} SKIP LOCKED'
+        return sql, params
+
+    @staticmethod
+    def _find_waiting_session(vibe_tag: str, language: str, is_visitor: bool,
+                              exclude_user: User) -> Optional[ChatSession]:
+        """Lock and return the best compatible waiting session (see _waiting_session_sql)."""
+        sql, params = MatchingService._waiting_session_sql(vibe_tag, language, is_visitor, exclude_user)
+        return next(iter(ChatSession.objects.raw(sql, params)), None)
+
+    @staticmethod
+    def _claim_waiting_session(session: ChatSession, user: User) -> bool:
+        """
+        Atomically join a waiting session as user_b.
+        The conditional UPDATE only succeeds while the session is still open,
+        so two joiners can never both claim it.
+        """
+        started_at = timezone.now()
+        claimed = ChatSession.objects.filter(
+            id=session.id,
+            status='waiting',
+            user_b__isnull=True
+        ).update(user_b=user, status='active', started_at=started_at)
+
+        if claimed:
+            session.user_b = user
+            session.status = 'active'
+            session.started_at = started_at
+            # A cached (user_a, None) entry would lock the new partner out of the chat
+            MatchingService._invalidate_access_on_commit([session.id])
+        return bool(claimed)
+
+    @staticmethod
+    def _invalidate_access_on_commit(session_ids):
+        """
+        Drop cached chat membership once the change is visible, so a concurrent
+        connect can't re-cache the old participants in between.
+        """
+        session_ids = list(session_ids)
+        transaction.on_commit(lambda: invalidate_sessions(session_ids))
+
+    @staticmethod
+    def _match_messages(session_id: str, user_a_id, user_a_nickname: str,
+                        user_b_id, user_b_nickname: str) -> List[Tuple[str, dict]]:
+        """Build the match_found (group, message) pair for each side of a session."""
+        return [
+            (f'user_{user_id}', {
+                'type': 'match_found',
+                'session_id': session_id,
+                'matched_user': partner_nickname,
+                'message': f'Great! You\'re matched with {partner_nickname}'
+            })
+            for user_id, partner_nickname in (
+                (user_a_id, user_b_nickname),
+                (user_b_id, user_a_nickname),
+            )
+        ]
+
+    @staticmethod
+    async def _asend_notifications(messages: List[Tuple[str, dict]]):
+        """Send (group, message) pairs concurrently on the channel layer."""
+        channel_layer = get_channel_layer()
+        await asyncio.gather(*(
+            channel_layer.group_send(group, message) for group, message in messages
+        ))
+
+    @staticmethod
+    def _send_on_commit(messages: List[Tuple[str, dict]]):
+        """
+        Deliver notifications once the surrounding transaction commits, so
+        channel layer latency never extends row lock hold time.
+        Runs immediately when there is no open transaction.
+        """
+        transaction.on_commit(
+            lambda: async_to_sync(MatchingService._asend_notifications)(messages)
+        )
 
     @staticmethod
     def _notify_match_found(user_a: User, user_b: User, session):
         """Send WebSocket notifications to both matched users."""
-        channel_layer = get_channel_layer()
-        
-        # Notify user A
-        async_to_sync(channel_layer.group_send)(
-            f'user_{user_a.id}',
-            {
-                'type': 'match_found',
-                'session_id': str(session.id),
-                'matched_user': user_b.nickname,
-                'message': f'Great! You\'re matched with {user_b.nickname}'
-            }
+        MatchingService._send_on_commit(
+            MatchingService._match_messages(
+                str(session.id), user_a.id, user_a.nickname, user_b.id, user_b.nickname
+            )
         )
-        
-        # Notify user B
-        async_to_sync(channel_layer.group_send)(
-            f'user_{user_b.id}',
-            {
-                'type': 'match_found',
-                'session_id': str(session.id),
-                'matched_user': user_a.nickname,
-                'message': f'Great! You\'re matched with {user_a.nickname}'
-            }
-        )
\ No newline at end of file
+
+    @staticmethod
+    def _notify_matches(sessions):
+        """Send match_found to both users of every session in one async batch."""
+        messages = []
+        for session in sessions:
+            messages.extend(MatchingService._match_messages(
+                str(session.id),
+                session.user_a.id, session.user_a.nickname,
+                session.user_b.id, session.user_b.nickname
+            ))
+        MatchingService._send_on_commit(messages)
+
+    @staticmethod
+    def get_metrics() -> dict:
+        """In-process latency metrics and counters (lock hold times, typing suppression)."""
+        return snapshot_all()
+
+    @staticmethod
+    def result_message(result: dict) -> str:
+        """User-facing message for a join_queue result."""
+        if result['status'] == 'matched':
+            return f"Great! You're matched with {result['matched_user']}"
+        return f"You're in queue (position {result['queue_position']})"
@@ -0,0 +1,122 @@
+"""
+Queue statistics.
+Counters are adjusted on every enqueue, dequeue and match, so reading them
+is O(1); the stats endpoint additionally serves a short-lived cached
+snapshot that only one request at a time may refresh.
+"""
+
+import time
+from typing import Callable, Iterable, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def empty_stats() -> dict:
+    return {
+        'total_waiting': 0,
+        'by_vibe_tag': {},
+        'by_language': {},
+        'visitors_waiting': 0,
+    }
+
+
+def stats_from_counts(counts: dict) -> dict:
+    """Turn flat counter fields ('total', 'vibe:<tag>', 'lang:<lang>', 'visitors') into a stats dict."""
+    stats = empty_stats()
+    for field, value in counts.items():
+        value = int(value)
+        if field == 'total':
+            stats['total_waiting'] = value
+        elif field == 'visitors':
+            stats['visitors_waiting'] = value
+        elif field.startswith('vibe:') and value:
+            stats['by_vibe_tag'][field[5:]] = value
+        elif field.startswith('lang:') and value:
+            stats['by_language'][field[5:]] = value
+    return stats
+
+
+class QueueCounters:
+    """
+    Waiting-user counters kept in the Django cache (shared between workers
+    when the cache is Redis). Used by engines without their own atomic store.
+    """
+
+    PREFIX = 'matchq:stats'
+
+    def __init__(self, vibe_tags: Iterable[str], languages: Iterable[str]):
+        self.fields = ['total', 'visitors']
+        self.fields += [f'vibe:{tag}' for tag in vibe_tags]
+        self.fields += [f'lang:{lang}' for lang in languages]
+
+    def key(self, field: str) -> str:
+        return f'{self.PREFIX}:{field}'
+
+    def record(self, delta: int, vibe_tag: str, language: str, is_visitor: bool):
+        """Adjust counters for one user entering (+1) or leaving (-1) the queue."""
+        fields = ['total', f'vibe:{vibe_tag}', f'lang:{language}']
+        if is_visitor:
+            fields.append('visitors')
+        for field in fields:
+            key = self.key(field)
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                # Missing counter: the next snapshot rebuilds everything from the database
+                self.invalidate()
+                return
+
+    def record_many(self, delta: int, entries: Iterable[Tuple[str, str, bool]]):
+        for vibe_tag, language, is_visitor in entries:
+            self.record(delta, vibe_tag, language, is_visitor)
+
+    def invalidate(self):
+        """Force the next snapshot to rebuild every counter from the database."""
+        cache.delete(self.key('total'))
+
+    def snapshot(self, rebuild: Callable[[], dict]) -> dict:
+        """Current counters; calls rebuild() for raw counts if any were never initialised, expired or evicted."""
+        values = cache.get_many([self.key(field) for field in self.fields])
+        if len(values) < len(self.fields):
+            counts = rebuild()
+            # Expiry doubles as a periodic reconcile: any drift lasts one TTL at most
+            cache.set_many(
+                {self.key(field): counts.get(field, 0) for field in self.fields},
+                timeout=settings.MATCH_QUEUE_COUNTERS_TTL_SECONDS
+            )
+            return stats_from_counts(counts)
+        return stats_from_counts({
+            field: values.get(self.key(field), 0) for field in self.fields
+        })
+
+
+SNAPSHOT_KEY = 'matchq:stats:snapshot'
+REFRESH_LOCK_KEY = 'matchq:stats:refresh'
+
+
+def cached_snapshot(compute: Callable[[], dict]) -> dict:
+    """
+    Serve a snapshot at most MATCH_STATS_CACHE_SECONDS old.
+    When it goes stale, only the request that wins the refresh lock recomputes;
+    everyone else keeps getting the previous snapshot meanwhile.
+    """
+    ttl = settings.MATCH_STATS_CACHE_SECONDS
+    cached = cache.get(SNAPSHOT_KEY)
+    now = time.time()
+
+    if cached and cached['expires_at'] > now:
+        return cached['stats']
+
+    locked = cache.add(REFRESH_LOCK_KEY, 1, timeout=max(ttl, 1))
+    if cached and not locked:
+        return cached['stats']
+
+    try:
+        stats = compute()
+        # Keep stale copies around long enough to cover slow refreshes
+        cache.set(SNAPSHOT_KEY, {'stats': stats, 'expires_at': now + ttl}, timeout=max(ttl * 10, 10))
+        return stats
+    finally:
+        if locked:
+            cache.delete(REFRESH_LOCK_KEY)
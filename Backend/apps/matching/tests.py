@@ -1,3 +1,438 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import threading
+from collections import Counter
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from apps.chat.models import ChatSession
+from apps.users.models import User
+from apps.users.principals import invalidate_tokens
+from fusetalkconfig.asgi import TokenAuthMiddleware
+from fusetalkconfig.db.pool import pool_stats
+from . import presence
+from .engines import LANGUAGES, VIBE_TAGS, OrmQueueEngine, QueueEntry
+from .loadtest import MatchingLoadTest
+from .models import LANGUAGE_CHOICES, MatchQueue
+from .rounds import (
+    EXACT_LANGUAGE_SCORE, MAX_WAIT_SCORE, RANDOM_VIBE_SCORE, SAME_VIBE_SCORE, VISITOR_LOCAL_SCORE, pair_pool,
+    score_pair,
+)
+from .routing import websocket_urlpatterns
+from .services import MatchingService
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are only checked on PostgreSQL")
+class MatchingQueryPlanTests(TestCase):
+    """Matching hot queries must stay on their indexes as the tables grow."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([
+            User(username=f'plan_{i}', nickname=f'plan_{i}') for i in range(200)
+        ])
+        cls.user = users[0]
+        now = timezone.now()
+
+        # Mostly finished sessions with a small open waiting set, like production
+        sessions = [
+            ChatSession(
+                user_a=users[i % 200],
+                user_b=users[(i + 1) % 200],
+                topic_tag='music',
+                status='ended',
+                ended_at=now
+            )
+            for i in range(20000)
+        ]
+        vibe_tags = [tag for tag, _ in MatchQueue.VIBE_TAG_CHOICES]
+        languages = [lang for lang, _ in LANGUAGE_CHOICES]
+        sessions += [
+            ChatSession(
+                user_a=users[i],
+                topic_tag=vibe_tags[i % len(vibe_tags)],
+                language=languages[i % len(languages)],
+                status='waiting'
+            )
+            for i in range(1, 101)
+        ]
+        ChatSession.objects.bulk_create(sessions)
+        MatchQueue.objects.bulk_create([
+            MatchQueue(user=users[i % 200], vibe_tag=vibe_tags[i % len(vibe_tags)])
+            for i in range(5000)
+        ])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE chat_sessions')
+            cursor.execute('ANALYZE match_queue')
+
+    def assertNoSeqScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, msg=f"Sequential scan in plan:\n{plan}")
+
+    def assertRankedOnIndexes(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        def nodes(node):
+            yield node
+            for child in node.get('Plans', []):
+                yield from nodes(child)
+
+        for node in nodes(plan[0]['Plan']):
+            self.assertNotEqual(node['Node Type'], 'Seq Scan', msg=f"Sequential scan in plan:\n{plan}")
+            if 'Sort' in node['Node Type']:
+                # Only the capped UNION ALL candidates may be sorted, never the waiting set itself
+                self.assertIn('Append', [child['Node Type'] for child in nodes(node)], msg=f"Full sort in plan:\n{plan}")
+
+    def test_partner_selection_query(self):
+        # The statement _find_waiting_session runs on every join
+        for vibe_tag in ('music', 'random'):
+            for language in ('english', 'mixed'):
+                for is_visitor in (False, True):
+                    with self.subTest(vibe_tag=vibe_tag, language=language, is_visitor=is_visitor):
+                        self.assertRankedOnIndexes(*MatchingService._waiting_session_sql(
+                            vibe_tag, language, is_visitor, self.user
+                        ))
+
+    def test_waiting_session_lookup_by_topic(self):
+        self.assertNoSeqScan(
+            MatchingService._waiting_sessions(self.user).filter(topic_tag='music')[:1]
+        )
+
+    def test_oldest_waiting_session_lookup(self):
+        self.assertNoSeqScan(MatchingService._waiting_sessions(self.user)[:1])
+
+    def test_previous_session_cleanup(self):
+        self.assertNoSeqScan(ChatSession.objects.filter(user_a=self.user, status='waiting'))
+        self.assertNoSeqScan(
+            ChatSession.objects.filter(user_b=self.user, status__in=['waiting', 'active'])
+        )
+
+    def test_match_queue_oldest_first(self):
+        self.assertNoSeqScan(MatchQueue.objects.order_by('created_at')[:1])
+        self.assertNoSeqScan(MatchQueue.objects.filter(vibe_tag='music')[:1])
+
+
+class PartnerRankingTests(TestCase):
+    """_find_waiting_session ranks by vibe tier, then exact language, then visitor preference, then age."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f'rank_{i}', nickname=f'rank_{i}') for i in range(7)
+        ])
+        waiting = [
+            ('gaming', 'english', False),
+            ('random', 'spanish', False),
+            ('random', 'mixed', False),
+            ('music', 'mixed', False),
+            ('music', 'english', False),
+            ('music', 'english', True),
+        ]
+        for user, (topic_tag, language, is_visitor) in zip(cls.users[1:], waiting):
+            ChatSession.objects.create(
+                user_a=user, topic_tag=topic_tag, language=language, is_visitor=is_visitor, status='waiting'
+            )
+
+    def pick(self, vibe_tag, language, is_visitor, user=None):
+        session = MatchingService._find_waiting_session(vibe_tag, language, is_visitor, user or self.users[0])
+        return session and session.user_a.username
+
+    def test_ranking(self):
+        cases = [
+            # Same tag and exact language; a local prefers the visitor
+            (('music', 'english', False), 'rank_6'),
+            (('music', 'english', True), 'rank_5'),
+            # A mixed joiner prefers other mixed sessions
+            (('music', 'mixed', False), 'rank_4'),
+            # No same-tag session: random before other tags, compatible languages only
+            (('sports', 'english', False), 'rank_3'),
+            (('random', 'spanish', False), 'rank_2'),
+            (('sports', 'french', False), 'rank_3'),
+        ]
+        for args, expected in cases:
+            with self.subTest(args=args):
+                self.assertEqual(self.pick(*args), expected)
+
+    def test_excludes_own_and_closed_sessions(self):
+        self.assertEqual(self.pick('gaming', 'english', False, user=self.users[1]), 'rank_3')
+        ChatSession.objects.update(status='ended')
+        self.assertIsNone(self.pick('music', 'english', False))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueueCounterTests(TestCase):
+    """ORM engine counters only move once the join or leave commits, and missing ones are rebuilt."""
+
+    def setUp(self):
+        cache.clear()
+        self.engine = OrmQueueEngine()
+        self.users = User.objects.bulk_create([
+            User(username=f'count_{i}', nickname=f'count_{i}') for i in range(2)
+        ])
+        # Counters start from the database
+        self.assertEqual(self.engine.stats()['total_waiting'], 0)
+
+    def test_rolled_back_join_is_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.engine.join(self.users[0], 'music', 'english', False, notify=False)
+                    raise DatabaseError('rolled back')
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.engine.stats()['total_waiting'], 0)
+
+    def test_committed_joins_are_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.engine.join(self.users[0], 'music', 'english', False, notify=False)
+        self.assertEqual(self.engine.stats()['by_vibe_tag'], {'music': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.engine.join(self.users[1], 'music', 'english', False, notify=False)
+        self.assertEqual(self.engine.stats()['total_waiting'], 0)
+
+    def test_missing_counter_is_rebuilt(self):
+        ChatSession.objects.create(user_a=self.users[0], topic_tag='music', language='english', status='waiting')
+        # Any expired or evicted field triggers a rebuild, not just the total
+        cache.delete(self.engine.counters.key('vibe:music'))
+        self.assertEqual(self.engine.stats()['by_vibe_tag'], {'music': 1})
+
+
+class RoundPairingTests(SimpleTestCase):
+    """score_pair weights and pair_pool's per-bucket shortcut."""
+
+    def entry(self, user_id, vibe_tag='music', language='english', is_visitor=False, enqueued_at=0.0):
+        return QueueEntry(user_id, vibe_tag, language, is_visitor, enqueued_at)
+
+    def test_score_pair(self):
+        local = self.entry('a')
+        self.assertIsNone(score_pair(local, self.entry('b', language='spanish'), now=0))
+        self.assertEqual(score_pair(local, self.entry('b'), now=0), SAME_VIBE_SCORE + EXACT_LANGUAGE_SCORE)
+        self.assertEqual(
+            score_pair(local, self.entry('b', vibe_tag='random', language='mixed', is_visitor=True), now=0),
+            RANDOM_VIBE_SCORE + VISITOR_LOCAL_SCORE
+        )
+        self.assertEqual(score_pair(local, self.entry('b', vibe_tag='gaming'), now=0), EXACT_LANGUAGE_SCORE)
+        # Waiting adds up to a cap
+        self.assertEqual(
+            score_pair(local, self.entry('b', vibe_tag='gaming'), now=1000), EXACT_LANGUAGE_SCORE + MAX_WAIT_SCORE
+        )
+
+    def test_pair_pool(self):
+        pool = [
+            self.entry('old', enqueued_at=0),
+            self.entry('spanish', language='spanish', enqueued_at=1),
+            self.entry('visitor', is_visitor=True, enqueued_at=2),
+            self.entry('music', enqueued_at=3),
+        ]
+        pairs = [(a.user_id, b.user_id) for a, b in pair_pool(pool, now=10)]
+        # The visitor outscores the older local; nobody speaks Spanish
+        self.assertEqual(pairs, [('old', 'visitor')])
+
+    def test_never_pairs_a_user_with_themselves(self):
+        pool = [self.entry('a', enqueued_at=0), self.entry('a', enqueued_at=1), self.entry('b', enqueued_at=2)]
+        self.assertEqual([(a.user_id, b.user_id) for a, b in pair_pool(pool, now=10)], [('a', 'b')])
+
+    def test_matches_a_scan_of_the_whole_pool(self):
+        def scan(entries, now):
+            unpaired = sorted(entries, key=lambda entry: entry.enqueued_at)
+            pairs = []
+            while unpaired:
+                current = unpaired.pop(0)
+                scored = [
+                    (score, -candidate.enqueued_at, index)
+                    for index, candidate in enumerate(unpaired)
+                    for score in [score_pair(current, candidate, now)] if score is not None
+                ]
+                if scored:
+                    pairs.append((current, unpaired.pop(max(scored)[2])))
+            return pairs
+
+        rng = random.Random(7)
+        for _ in range(20):
+            pool = [
+                self.entry(
+                    str(i), rng.choice(VIBE_TAGS), rng.choice(LANGUAGES), rng.random() < 0.3, rng.random() * 60
+                ) for i in range(60)
+            ]
+            self.assertEqual(pair_pool(pool, now=60), scan(pool, now=60))
+
+
+@override_settings(
+    MATCH_PRESENCE_TTL_SECONDS=90,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class PresenceTests(SimpleTestCase):
+    """Every open socket keeps its user online, even after a counter expires."""
+
+    def setUp(self):
+        cache.clear()
+
+    def at(self, seconds):
+        return mock.patch('apps.matching.presence.time.time', return_value=seconds)
+
+    def test_expired_counter_keeps_other_sockets(self):
+        with self.at(0):
+            first, second = presence.connected('u'), presence.connected('u')
+        # Heartbeats resume after the counters the sockets started in have lapsed
+        with self.at(200):
+            self.assertEqual(presence.online_user_ids(['u']), set())
+            first = presence.heartbeat('u', first)
+            second = presence.heartbeat('u', second)
+            self.assertFalse(presence.disconnected('u', first))
+            self.assertEqual(presence.online_user_ids(['u', 'v']), {'u'})
+            self.assertTrue(presence.disconnected('u', second))
+
+    def test_dead_socket_goes_offline_within_ttl(self):
+        with self.at(0):
+            presence.connected('u')
+        with self.at(89):
+            self.assertEqual(presence.online_user_ids(['u']), {'u'})
+        with self.at(90):
+            self.assertEqual(presence.online_user_ids(['u']), set())
+
+
+@skipUnless(connection.vendor == 'postgresql', "Row-level locking needs PostgreSQL")
+@override_settings(
+    MATCH_QUEUE_ENGINE='orm',
+    MATCH_ROUNDS_ENABLED=False,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ConcurrentJoinTests(TransactionTestCase):
+    """Concurrent joiners must never share a waiting session."""
+
+    JOINERS = 60
+
+    def test_concurrent_joins_do_not_double_match(self):
+        users = User.objects.bulk_create([
+            User(username=f'concurrent_{i}', nickname=f'concurrent_{i}') for i in range(self.JOINERS)
+        ])
+        barrier = threading.Barrier(self.JOINERS)
+        results, errors = {}, []
+
+        def join(user):
+            try:
+                barrier.wait()
+                results[user.id] = MatchingService.join_queue(user, 'music', 'mixed')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=join, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.JOINERS)
+
+        active = ChatSession.objects.filter(status='active')
+        participants = Counter()
+        for user_a_id, user_b_id in active.values_list('user_a_id', 'user_b_id'):
+            self.assertNotEqual(user_a_id, user_b_id)
+            participants[user_a_id] += 1
+            participants[user_b_id] += 1
+
+        # Nobody is in two active sessions, and every matched result points at a real session
+        self.assertTrue(all(count == 1 for count in participants.values()), participants)
+        matched = [result for result in results.values() if result['status'] == 'matched']
+        self.assertEqual(len(matched), active.count())
+
+        # Everyone is either matched or still waiting - no one was lost
+        waiting = ChatSession.objects.filter(status='waiting').count()
+        self.assertEqual(len(participants) + waiting, self.JOINERS)
+
+
+@override_settings(
+    MATCH_QUEUE_ENGINE='orm',
+    MATCH_ROUNDS_ENABLED=False,
+    MATCH_QUEUE_UPDATE_INTERVAL_MS=0,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class MatchingLoadTests(TransactionTestCase):
+    """Small runs of the load-test harness; `manage.py loadtest_matching` runs the full size."""
+
+    USERS = 40
+
+    def assertIntegrity(self, report):
+        self.assertEqual(report['errors'], 0, report)
+        self.assertEqual(report['double_matches'], 0, report)
+        self.assertEqual(report['lost_users'], 0, report)
+        self.assertEqual(report['undelivered'], 0, report)
+        self.assertEqual(report['matched_users'] + report['waiting_users'], self.USERS, report)
+        self.assertEqual(report['join_to_match_found']['count'], report['matched_users'], report)
+
+    def test_service_joins(self):
+        self.assertIntegrity(MatchingLoadTest(users=self.USERS, mode='service', seed=1).run())
+
+    def test_websocket_joins(self):
+        self.assertIntegrity(MatchingLoadTest(users=self.USERS, mode='websocket', seed=1).run())
+
+    @skipUnless(connection.vendor == 'postgresql', "Row-level locking needs PostgreSQL")
+    def test_parallel_service_joins(self):
+        self.assertIntegrity(
+            MatchingLoadTest(users=self.USERS, mode='service', parallel=True, seed=1).run()
+        )
+
+
+@skipUnless(connection.settings_dict['ENGINE'] == 'fusetalkconfig.db', "Needs the pooled backend (DB_POOL_ENABLED)")
+@override_settings(
+    MATCH_QUEUE_ENGINE='orm',
+    MATCH_ROUNDS_ENABLED=False,
+    MATCH_QUEUE_UPDATE_INTERVAL_MS=0,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class PooledConnectionTests(TransactionTestCase):
+    """Async views and consumers must hand every pooled connection back."""
+
+    REQUESTS = 20
+
+    def in_use(self):
+        return {name: stats['in_use'] for name, stats in pool_stats().items()}
+
+    def test_async_paths_return_connections(self):
+        user = User.objects.create(username='pooled', nickname='pooled')
+        token = Token.objects.create(user=user).key
+        before = self.in_use()
+
+        async def requests():
+            client = AsyncClient()
+            headers = {'authorization': f'Token {token}'}
+            for _ in range(self.REQUESTS):
+                # Miss the principal cache so authentication queries too
+                invalidate_tokens([token])
+                self.assertEqual((await client.get('/api/chat/fuse-moments/', headers=headers)).status_code, 200)
+                self.assertEqual((await client.post('/api/match/leave/', headers=headers)).status_code, 200)
+
+            communicator = WebsocketCommunicator(
+                TokenAuthMiddleware(URLRouter(websocket_urlpatterns)), f'/ws/matching/?token={token}'
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            for message_type in ['heartbeat', 'leave'] * self.REQUESTS:
+                await communicator.send_json_to({'type': message_type})
+                await communicator.receive_json_from()
+            await communicator.disconnect()
+
+        # asyncio.run, not async_to_sync: consumer database calls must run on their own thread as in production
+        asyncio.run(requests())
+        self.assertEqual(self.in_use(), before)
@@ -0,0 +1,62 @@
+"""
+Pushes queue_update events to waiting users.
+Queue engines record which buckets changed (someone ahead matched or left);
+the publisher drains those once per interval, so each waiting user gets at
+most one position update per interval no matter how busy their bucket is.
+"""
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from .engines import get_queue_engine
+from .services import MatchingService
+
+logger = logging.getLogger(__name__)
+
+
+class QueueUpdatePublisher:
+    """One background publisher per event loop, started by MatchingConsumer."""
+
+    _tasks = {}
+
+    @classmethod
+    def ensure_running(cls):
+        """Start the publisher on the current event loop if it isn't running yet."""
+        if settings.MATCH_QUEUE_UPDATE_INTERVAL_MS <= 0:
+            return
+
+        loop = asyncio.get_running_loop()
+        task = cls._tasks.get(loop)
+        if task is None or task.done():
+            cls._tasks[loop] = loop.create_task(cls.run())
+
+    @classmethod
+    async def run(cls):
+        interval = settings.MATCH_QUEUE_UPDATE_INTERVAL_MS / 1000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await cls.publish_once()
+            except Exception as e:
+                logger.error(f"Queue update publish failed: {str(e)}")
+
+    @staticmethod
+    async def publish_once(engine=None) -> int:
+        """Send one coalesced round of queue_update events. Returns the number sent."""
+        engine = engine or get_queue_engine()
+        updates = await database_sync_to_async(engine.pending_updates)()
+        if not updates:
+            return 0
+
+        await MatchingService._asend_notifications([
+            (f'user_{user_id}', {
+                'type': 'queue_update',
+                'position': position,
+                'message': f"You're in queue (position {position})"
+            })
+            for user_id, position in updates
+        ])
+        return len(updates)
@@ -9,11 +9,13 @@ from . import views
 app_name = 'matching'
 
 urlpatterns = [
-    # Core matching endpoints
-    path('join/', views.JoinQueueView.as_view(), name='join_queue'),
-    path('leave/', views.LeaveQueueView.as_view(), name='leave_queue'),
+    # Core matching endpoints (join/leave are served by the async views)
+    path('join/', views.join_queue, name='join_queue'),
+    path('next/', views.NextMatchView.as_view(), name='next_match'),
+    path('leave/', views.leave_queue, name='leave_queue'),
 
     # Monitoring endpoints
     path('stats/', views.QueueStatsView.as_view(), name='queue_stats'),
+    path('metrics/', views.QueueMetricsView.as_view(), name='queue_metrics'),
     path('health/', views.health_check, name='health_check'),
 ]
\ No newline at end of file
@@ -4,14 +4,16 @@ Uses DRF class-based views for clean, maintainable code.
 """
 
 import logging
+from channels.db import database_sync_to_async
 from rest_framework import status
 from rest_framework.decorators import api_view
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from fusetalkconfig.async_api import async_api_view
 from .services import MatchingService
 from .serializers import (
     JoinQueueSerializer,
@@ -22,15 +24,60 @@ from .serializers import (
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-class JoinQueueView(APIView):
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def join_queue(request):
     """
     POST /api/match/join
-    Add user to matching queue and attempt to find a match.
+    Add user to matching queue and attempt to find a match. Only the queue
+    transaction runs in the sync executor; match_found is sent from the event loop.
     """
-    permission_classes =[IsAuthenticated]
+    serializer = JoinQueueSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(
+            {'error': 'Invalid data', 'details': serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        result = await database_sync_to_async(MatchingService.join_queue)(
+            user=request.user,
+            vibe_tag=serializer.validated_data['vibe_tag'],
+            language=serializer.validated_data['language'],
+            is_visitor=serializer.validated_data['is_visitor'],
+            notify=False
+        )
+        if result['status'] == 'matched':
+            await MatchingService._asend_notifications(MatchingService._match_messages(
+                result['session_id'],
+                result['matched_user_id'], result['matched_user'],
+                request.user.id, request.user.nickname
+            ))
+
+        result['message'] = MatchingService.result_message(result)
+        response_serializer = MatchResponseSerializer(result)
+
+        logger.info(f"Queue join: {request.user.nickname} - {result['status']}")
+
+        return Response(
+            response_serializer.data,
+            status=status.HTTP_200_OK
+        )
+
+    except Exception as e:
+        logger.error(f"Queue join error for {request.user.nickname}: {str(e)}")
+        return Response(
+            {'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+class NextMatchView(APIView):
+    """
+    POST /api/match/next
+    End the current chat session and rejoin the queue in one request.
+    """
+    permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        """Handle queue join requests."""
+        """Handle "Next" requests."""
         serializer = JoinQueueSerializer(data=request.data)
 
         if not serializer.is_valid():
@@ -39,63 +86,52 @@ class JoinQueueView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         try:
-            # Use our service layer for business logic
-            result = MatchingService.join_queue(
+            result = MatchingService.next_match(
                 user=request.user,
                 vibe_tag=serializer.validated_data['vibe_tag'],
                 language=serializer.validated_data['language'],
                 is_visitor=serializer.validated_data['is_visitor']
             )
 
-            # Add user-friendly message
-            if result['status'] == 'matched':
-                result['message'] = f"Great! You're matched with {result['matched_user']}"
-            else:
-                result['message'] = f"You're in queue (position {result['queue_position']})"
-
-            # Serializer response
+            result['message'] = MatchingService.result_message(result)
             response_serializer = MatchResponseSerializer(result)
 
-            logger.info(f"Queue join: {request.user.nickname} - {result['status']}")
+            logger.info(f"Queue next: {request.user.nickname} - {result['status']}")
 
             return Response(
                 response_serializer.data,
                 status=status.HTTP_200_OK
             )
-        
+
         except Exception as e:
-            logger.error(f"Queue join error for {request.user.nickname}: {str(e)}")
+            logger.error(f"Queue next error for {request.user.nickname}: {str(e)}")
             return Response(
                 {'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class LeaveQueueView(APIView):
+@async_api_view(['POST'], permission_classes=[IsAuthenticated])
+async def leave_queue(request):
     """
     POST /api/match/leave
     Remove user from matching queue.
     """
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        """Handle queue leave requests."""
-        try:
-            success = MatchingService.leave_queue(request.user)
+    try:
+        success = await database_sync_to_async(MatchingService.leave_queue)(request.user)
 
-            if success:
-                return Response(
-                    {'message': 'Successfully left the queue'}, status=status.HTTP_200_OK
-                )
-            else:
-                return Response(
-                    {'message': 'You were not in the queue'}, status=status.HTTP_200_OK
-                )
-            
-        except Exception as e:
-            logger.error(f"Queue leave error for {request.user.nickname}: {str(e)}")
+        if success:
             return Response(
-                {'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'message': 'Successfully left the queue'}, status=status.HTTP_200_OK
             )
-        
+        return Response(
+            {'message': 'You were not in the queue'}, status=status.HTTP_200_OK
+        )
+
+    except Exception as e:
+        logger.error(f"Queue leave error for {request.user.nickname}: {str(e)}")
+        return Response(
+            {'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 class QueueStatsView(APIView):
     """
     GET /api/match/stats
@@ -121,6 +157,18 @@ class QueueStatsView(APIView):
                 {'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
+class QueueMetricsView(APIView):
+    """
+    GET /api/match/metrics
+    Realtime metrics, e.g. join_queue lock hold times and typing counters (staff only).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Get matching latency metrics."""
+        return Response(MatchingService.get_metrics(), status=status.HTTP_200_OK)
+
 # Simple function-based view for health check
 @api_view(['GET'])
 def health_check(request):
@@ -0,0 +1,25 @@
+"""
+DRF authentication backed by the token principal cache.
+"""
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .principals import principal_for_token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that resolves keys through principals.py instead of a query per request."""
+
+    def authenticate_credentials(self, key):
+        principal = principal_for_token(key)
+        if principal is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not principal.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        # No query here: the principal answers auth checks, other fields load the row on first use
+        user = principal.to_user()
+        return (user, Token(key=key, user_id=user.id))
@@ -0,0 +1,241 @@
+"""
+Token-to-user resolution cache.
+REST calls and WebSocket connects authenticate with a DRF token; instead of a
+Token+User join per request, the few user fields auth needs are cached by token
+key as a Principal: in-process (LRU with a short TTL) and, when
+AUTH_TOKEN_CACHE_SHARED is on, in the shared cache so other workers skip the
+database too. Entries are dropped when a token is deleted or its user is saved
+(deactivation included). Other workers' in-process entries are not
+reachable from here and expire within AUTH_TOKEN_CACHE_TTL_SECONDS.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+PRINCIPAL_PREFIX = 'auth:principal'
+
+
+class Principal(NamedTuple):
+    """The user fields authentication and the consumers rely on."""
+    id: str
+    username: str
+    nickname: str
+    is_active: bool
+    is_staff: bool
+    is_superuser: bool
+
+    def to_socket_principal(self) -> 'SocketPrincipal':
+        flags = (SocketPrincipal.STAFF if self.is_staff else 0) | (SocketPrincipal.SUPERUSER if self.is_superuser else 0)
+        return SocketPrincipal(self.id, self.nickname, flags)
+
+    def to_user(self) -> 'PrincipalUser':
+        return PrincipalUser(self)
+
+
+class PrincipalUser(SimpleLazyObject):
+    """
+    request.user for a cached principal. The principal's own fields are answered
+    without a query; anything else (another field, a save, using it as an ORM
+    value) loads the full User row once, as Django's own lazy request.user does.
+    """
+
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, principal: Principal):
+        self.__dict__['_principal'] = principal
+        super().__init__(lambda: User.objects.get(pk=principal.id))
+
+    @property
+    def id(self):
+        return User._meta.pk.to_python(self._principal.id)
+
+    pk = id
+
+    @property
+    def username(self) -> str:
+        return self._principal.username
+
+    @property
+    def nickname(self) -> str:
+        return self._principal.nickname
+
+    @property
+    def is_active(self) -> bool:
+        return self._principal.is_active
+
+    @property
+    def is_staff(self) -> bool:
+        return self._principal.is_staff
+
+    @property
+    def is_superuser(self) -> bool:
+        return self._principal.is_superuser
+
+
+class SocketPrincipal:
+    """
+    The user as a WebSocket connection holds it for its whole lifetime: two
+    strings and a flag word instead of a User instance with its model state.
+    Consumers call as_user() only for the duration of an ORM call.
+    """
+
+    __slots__ = ('id', 'nickname', 'flags')
+
+    STAFF = 1
+    SUPERUSER = 2
+
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, id, nickname: str, flags: int = 0):
+        self.id = User._meta.pk.to_python(id)
+        self.nickname = nickname
+        self.flags = flags
+
+    @classmethod
+    def from_user(cls, user) -> 'SocketPrincipal':
+        """Compact form of an authenticated User (or principal) from the connection scope."""
+        if isinstance(user, cls):
+            return user
+        flags = (cls.STAFF if user.is_staff else 0) | (cls.SUPERUSER if user.is_superuser else 0)
+        return cls(user.id, user.nickname, flags)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def is_staff(self) -> bool:
+        return bool(self.flags & self.STAFF)
+
+    @property
+    def is_superuser(self) -> bool:
+        return bool(self.flags & self.SUPERUSER)
+
+    def as_user(self):
+        return partial_user(id=self.id, nickname=self.nickname)
+
+    def __str__(self):
+        return self.nickname
+
+
+def partial_user(**values):
+    """A User with only these fields loaded; other fields are fetched on first access."""
+    values['id'] = User._meta.pk.to_python(values['id'])
+    # from_db takes the loaded values in model field order
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db('default', field_names, [values[name] for name in field_names])
+
+
+def socket_principal(user):
+    """What a consumer should keep as self.user: a SocketPrincipal, or the AnonymousUser as is."""
+    return user if user.is_anonymous else SocketPrincipal.from_user(user)
+
+
+class LocalLRUCache:
+    """Thread-safe LRU map whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys: Iterable):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = LocalLRUCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL_SECONDS)
+
+
+def principal_key(token_key: str) -> str:
+    return f'{PRINCIPAL_PREFIX}:{token_key}'
+
+
+def cached_principal(token_key: str) -> Optional[Principal]:
+    """In-process lookup only; safe to call from the event loop."""
+    return _local.get(token_key)
+
+
+def principal_for_token(token_key: str) -> Optional[Principal]:
+    """The token's Principal, or None for an unknown token. Inactive users are returned too."""
+    principal = _local.get(token_key)
+    if principal is not None:
+        return principal
+
+    if settings.AUTH_TOKEN_CACHE_SHARED:
+        shared = cache.get(principal_key(token_key))
+        if shared is not None:
+            principal = Principal(*shared)
+            _local.set(token_key, principal)
+            return principal
+
+    row = Token.objects.filter(key=token_key).values_list(
+        'user_id', 'user__username', 'user__nickname', 'user__is_active', 'user__is_staff', 'user__is_superuser'
+    ).first()
+    if row is None:
+        # Unknown tokens aren't cached, so random keys can't flood the cache
+        return None
+
+    principal = Principal(str(row[0]), *row[1:])
+    _local.set(token_key, principal)
+    if settings.AUTH_TOKEN_CACHE_SHARED:
+        cache.set(principal_key(token_key), tuple(principal), timeout=settings.AUTH_TOKEN_SHARED_TTL_SECONDS)
+    return principal
+
+
+def invalidate_tokens(token_keys: Iterable[str]):
+    """Forget cached principals for these token keys, here and in the shared cache."""
+    token_keys = list(token_keys)
+    if not token_keys:
+        return
+    _local.delete_many(token_keys)
+    if settings.AUTH_TOKEN_CACHE_SHARED:
+        cache.delete_many([principal_key(token_key) for token_key in token_keys])
+
+
+def invalidate_users(user_ids: Iterable):
+    """Forget cached principals for every token of these users once the transaction commits."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    token_keys = list(Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True))
+    # Invalidating before commit would let a concurrent request re-cache the old row
+    transaction.on_commit(lambda: invalidate_tokens(token_keys))
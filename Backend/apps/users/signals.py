@@ -0,0 +1,27 @@
+"""
+Keep cached token principals (see principals.py) in step with the database.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .principals import invalidate_tokens, invalidate_users
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Also runs for tokens cascaded from a deleted user
+    transaction.on_commit(lambda: invalidate_tokens([instance.key]))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Deactivation, nickname or permission changes; logins only touch last_login
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    invalidate_users([instance.pk])
@@ -1,3 +1,83 @@
-from django.test import TestCase
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.core import signing
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from .authentication import CachedTokenAuthentication
+from .models import User
+from .tickets import TICKET_SALT, issue_ticket, verify_ticket
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """A cached token authenticates without touching the database."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='auth_user', nickname='auth_nick', email='auth@example.com')
+        self.key = Token.objects.create(user=self.user).key
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {self.key}')
+        return CachedTokenAuthentication().authenticate(request)
+
+    def test_cache_hit_makes_no_queries(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+            self.assertEqual(user.id, self.user.id)
+            self.assertEqual(user.nickname, 'auth_nick')
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(token.user_id, self.user.id)
+
+    def test_other_fields_load_the_user_once(self):
+        user, _ = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'auth@example.com')
+            self.assertEqual(user, self.user)
+            self.assertIsInstance(user, User)
+
+
+@override_settings(WS_TICKET_MAX_AGE_SECONDS=60)
+class ConnectTicketTests(SimpleTestCase):
+    """Tickets verify with CPU only and reject anything expired, forged or malformed."""
+
+    def setUp(self):
+        self.user = User(id=uuid.uuid4(), username='ticket_user', nickname='ticket_nick')
+
+    def test_round_trip(self):
+        session_id = uuid.uuid4()
+        ticket = verify_ticket(issue_ticket(self.user, session_id, 'b'))
+        self.assertEqual(ticket.user_id, str(self.user.id))
+        self.assertEqual(ticket.nickname, 'ticket_nick')
+        self.assertEqual(ticket.role, 'b')
+        self.assertTrue(ticket.grants_session(session_id))
+        self.assertFalse(ticket.grants_session(uuid.uuid4()))
+        self.assertFalse(verify_ticket(issue_ticket(self.user)).grants_session(session_id))
+
+    def test_expiry(self):
+        issued_at = time.time()
+        with mock.patch('django.core.signing.time.time', return_value=issued_at):
+            ticket = issue_ticket(self.user)
+        with mock.patch('django.core.signing.time.time', return_value=issued_at + 59):
+            self.assertIsNotNone(verify_ticket(ticket))
+        with mock.patch('django.core.signing.time.time', return_value=issued_at + 61):
+            self.assertIsNone(verify_ticket(ticket))
+
+    def test_rejects_tampered_tickets(self):
+        ticket = issue_ticket(self.user)
+        _, rest = ticket.split(':', 1)
+        forged = signing.dumps({'u': str(uuid.uuid4()), 'n': 'ticket_nick'}, salt=TICKET_SALT).split(':', 1)[0]
+        for tampered in [
+            f'{forged}:{rest}',
+            ticket[:-1] + ('A' if ticket[-1] != 'A' else 'B'),
+            signing.dumps({'u': str(self.user.id), 'n': 'ticket_nick'}, salt='another-salt'),
+            # Correctly signed, but not ticket claims
+            signing.dumps(['not', 'claims'], salt=TICKET_SALT),
+            signing.dumps({'n': 'ticket_nick'}, salt=TICKET_SALT),
+            'garbage',
+        ]:
+            with self.subTest(ticket=tampered):
+                self.assertIsNone(verify_ticket(tampered))
@@ -10,5 +10,6 @@ app_name = 'users'
 urlpatterns = [
     path('guest/', views.guest_register, name='guest_register'),
     path('profile/', views.profile, name='profile'),
+    path('ws-ticket/', views.ws_ticket, name='ws_ticket'),
     path('health/', views.health_check, name='health_check'),
 ]
@@ -9,9 +9,13 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.exceptions import ValidationError
 
+from apps.chat.access import session_participants
 from .serializers import GuestRegistrationSerializer, UserProfileSerializer
+from .tickets import issue_ticket
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +69,31 @@ def profile(request):
     serializer = UserProfileSerializer(request.user)
     return Response(serializer.data)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def ws_ticket(request):
+    """
+    POST /api/auth/ws-ticket
+    Issue a short-lived signed ticket for connecting WebSockets with ?ticket=...
+    Pass session_id to also cover that session's chat and signaling sockets.
+    """
+    session_id = request.data.get('session_id')
+    role = None
+    if session_id:
+        try:
+            participants = session_participants(session_id)
+        except ValidationError:
+            participants = None
+        user_id = str(request.user.id)
+        if not participants or user_id not in participants:
+            return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+        role = 'a' if participants[0] == user_id else 'b'
+
+    return Response({
+        'ticket': issue_ticket(request.user, session_id, role),
+        'expires_in': settings.WS_TICKET_MAX_AGE_SECONDS,
+    })
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
@@ -16,29 +16,38 @@ from .routing import websocket_urlpatterns
 
 # Custom token authentication middleware for WebSockets
 from django.contrib.auth.models import AnonymousUser
-from rest_framework.authtoken.models import Token
 from channels.db import database_sync_to_async
 from urllib.parse import parse_qs
 
-@database_sync_to_async
-def get_user_from_token(token_key):
-    try:
-        token = Token.objects.select_related('user').get(key=token_key)
-        return token.user
-    except Token.DoesNotExist:
+from apps.users.principals import cached_principal, principal_for_token
+from apps.users.tickets import verify_ticket
+
+async def get_user_from_token(token_key):
+    # Reconnect storms are served from the in-process cache without a thread hop
+    principal = cached_principal(token_key)
+    if principal is None:
+        principal = await database_sync_to_async(principal_for_token)(token_key)
+    if principal is None or not principal.is_active:
         return AnonymousUser()
+    # Sockets hold a compact principal for their lifetime, not a User instance
+    return principal.to_socket_principal()
 
 class TokenAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
 
     async def __call__(self, scope, receive, send):
-        # Get token from query string
+        # Get ticket or token from query string
         query_string = scope.get('query_string', b'').decode()
         query_params = parse_qs(query_string)
+        ticket = query_params.get('ticket', [None])[0]
         token = query_params.get('token', [None])[0]
-        
-        if token:
+
+        # Signed tickets are checked with CPU only; consumers read scope['ticket'] too
+        scope['ticket'] = verify_ticket(ticket) if ticket else None
+        if scope['ticket']:
+            scope['user'] = scope['ticket'].to_socket_principal()
+        elif token:
             scope['user'] = await get_user_from_token(token)
         else:
             scope['user'] = AnonymousUser()
@@ -0,0 +1,82 @@
+"""
+Async views with DRF semantics.
+DRF 3.14 only dispatches synchronously, so behind daphne every APIView holds
+the sync executor thread for the whole request. AsyncAPIView keeps APIView's
+request pipeline and only changes where it runs: initial() (format suffix,
+content negotiation, versioning, authentication, permission and throttle
+checks) makes one database_sync_to_async call, the handler awaits its own
+database work on the event loop, and handle_exception/finalize_response run as
+usual. async_api_view turns an `async def view(request, ...)` into one, like
+DRF's @api_view.
+"""
+
+import asyncio
+from typing import List, Optional
+
+from channels.db import database_sync_to_async
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+# The browsable API renders templates and forms synchronously; async views speak the wire formats only
+ASYNC_RENDERER_CLASSES = [
+    renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+    if getattr(renderer, 'format', None) != 'api'
+]
+
+
+class AsyncAPIView(APIView):
+    """APIView whose HTTP method handlers are coroutines."""
+
+    renderer_classes = ASYNC_RENDERER_CLASSES
+
+    async def dispatch(self, request, *args, **kwargs):
+        """APIView.dispatch, awaiting the handler."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authenticators and throttles may query; database_sync_to_async closes what they open
+            await database_sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+def async_api_view(http_method_names: List[str], permission_classes: Optional[list] = None,
+                   throttle_classes: Optional[list] = None):
+    """@api_view for `async def view(request, ...)`: the function becomes the handler of an AsyncAPIView."""
+
+    def decorator(func):
+        async def handler(self, request, *args, **kwargs):
+            return await func(request, *args, **kwargs)
+
+        attrs = {
+            '__doc__': func.__doc__,
+            '__module__': func.__module__,
+            'http_method_names': [method.lower() for method in http_method_names] + ['options'],
+        }
+        attrs.update({method.lower(): handler for method in http_method_names})
+        if permission_classes is not None:
+            attrs['permission_classes'] = permission_classes
+        if throttle_classes is not None:
+            attrs['throttle_classes'] = throttle_classes
+
+        view_class = type(func.__name__, (AsyncAPIView,), attrs)
+        return view_class.as_view()
+
+    return decorator
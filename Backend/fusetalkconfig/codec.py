@@ -0,0 +1,181 @@
+"""
+Wire codecs for WebSocket frames and REST bodies.
+JSON is encoded with orjson when it is installed (stdlib json otherwise).
+Clients may instead negotiate MessagePack by offering the `fusetalk.msgpack`
+WebSocket subprotocol, or sending/accepting `application/msgpack` over REST.
+Consumers use CodecConsumerMixin and exchange Python objects via
+receive_payload/send_payload, so they never encode frames themselves.
+"""
+
+import json
+import logging
+from typing import Iterable, Optional, Tuple, Union
+
+import msgpack
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# UUIDs, datetimes, Decimals and lazy strings, the same way DRF's JSON renderer handles them
+_fallback = JSONEncoder().default
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+
+class DecodeError(ValueError):
+    """A frame or request body that the codec could not decode."""
+
+
+class Codec:
+    name = None
+    subprotocol = None
+    media_type = None
+    # Binary codecs use binary WebSocket frames
+    binary = False
+
+    def encode(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: Union[str, bytes]):
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = 'json'
+    subprotocol = 'fusetalk.json'
+    media_type = 'application/json'
+
+    def __init__(self, use_orjson: bool = True):
+        self.use_orjson = use_orjson and orjson is not None
+
+    def encode(self, obj) -> bytes:
+        if self.use_orjson:
+            # As DRF's JSONRenderer: non-string keys (list indexes in validation errors) become
+            # strings, and datetimes go through its encoder (UTC as 'Z')
+            return orjson.dumps(obj, default=_fallback, option=_ORJSON_OPTIONS)
+        return json.dumps(obj, default=_fallback, separators=(',', ':'), ensure_ascii=False).encode()
+
+    def decode(self, data: Union[str, bytes]):
+        try:
+            if self.use_orjson:
+                return orjson.loads(data)
+            return json.loads(data)
+        except ValueError as e:
+            raise DecodeError(str(e))
+
+
+class MsgpackCodec(Codec):
+    name = 'msgpack'
+    subprotocol = 'fusetalk.msgpack'
+    media_type = 'application/msgpack'
+    binary = True
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, default=_fallback, use_bin_type=True)
+
+    def decode(self, data: Union[str, bytes]):
+        if isinstance(data, str):
+            data = data.encode()
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise DecodeError(str(e))
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+CODECS = {codec.subprotocol: codec for codec in (JSON, MSGPACK)}
+
+
+def negotiate(subprotocols: Iterable[str]) -> Tuple[Codec, Optional[str]]:
+    """The first offered subprotocol we support, in the client's order; JSON if none is offered."""
+    for subprotocol in subprotocols:
+        if subprotocol in CODECS:
+            return CODECS[subprotocol], subprotocol
+    return JSON, None
+
+
+class CodecConsumerMixin:
+    """
+    Frame encoding for AsyncWebsocketConsumer subclasses.
+    Subclasses implement receive_payload and reply with send_payload.
+    """
+
+    codec = JSON
+    subprotocol = None
+
+    async def websocket_connect(self, message):
+        self.codec, self.subprotocol = negotiate(self.scope.get('subprotocols', ()))
+        await super().websocket_connect(message)
+
+    async def accept(self, subprotocol=None):
+        # The browser drops the socket unless we echo the subprotocol it offered
+        await super().accept(subprotocol or self.subprotocol)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = self.codec.decode(text_data if text_data is not None else bytes_data)
+        except DecodeError:
+            logger.warning(f"Undecodable {self.codec.name} frame on {type(self).__name__}")
+            return
+        await self.receive_payload(data)
+
+    async def receive_payload(self, data):
+        raise NotImplementedError
+
+    async def send_payload(self, payload):
+        encoded = self.codec.encode(payload)
+        if self.codec.binary:
+            await self.send(bytes_data=encoded)
+        else:
+            await self.send(text_data=encoded.decode())
+
+
+class FastJSONRenderer(renderers.BaseRenderer):
+    media_type = JSON.media_type
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return JSON.encode(data)
+
+
+class FastJSONParser(parsers.BaseParser):
+    media_type = JSON.media_type
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return JSON.decode(stream.read())
+        except DecodeError as e:
+            raise ParseError(f'JSON parse error - {e}')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = MSGPACK.media_type
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return MSGPACK.encode(data)
+
+
+class MessagePackParser(parsers.BaseParser):
+    media_type = MSGPACK.media_type
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return MSGPACK.decode(stream.read())
+        except DecodeError as e:
+            raise ParseError(f'MessagePack parse error - {e}')
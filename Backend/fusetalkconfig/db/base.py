@@ -0,0 +1,43 @@
+"""
+PostgreSQL backend whose connections come from the process-wide pool in
+fusetalkconfig.db.pool. Closing a connection, which Django does after every
+request and database_sync_to_async call when CONN_MAX_AGE is 0, returns it to
+the pool instead.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.settings_dict.get('CONN_MAX_AGE'):
+            # Threads would keep their connection between requests and starve the pool
+            raise ImproperlyConfigured("The pooled backend needs CONN_MAX_AGE = 0")
+        self._pool = None
+
+    def get_new_connection(self, conn_params):
+        self._pool = get_pool(
+            self.alias,
+            conn_params,
+            size=settings.DB_POOL_SIZE,
+            timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            check_idle=settings.DB_POOL_CHECK_IDLE_SECONDS,
+            max_lifetime=settings.DB_POOL_MAX_LIFETIME_SECONDS,
+        )
+        connect = super().get_new_connection
+        return self._pool.checkout(lambda: connect(conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                if self.in_atomic_block:
+                    # Django keeps a connection closed inside atomic() until the block exits
+                    self._pool.discard(self.connection)
+                else:
+                    self._pool.checkin(self.connection)
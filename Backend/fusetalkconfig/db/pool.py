@@ -0,0 +1,179 @@
+"""
+Process-wide PostgreSQL connection pool.
+Under ASGI, Django opens a connection per executor thread (one per in-flight
+HTTP request, plus the database_sync_to_async thread), and with CONN_MAX_AGE
+those connections outlive the request. A pool caps them at DB_POOL_SIZE per
+process: threads borrow a connection for one request or one
+database_sync_to_async call and hand it back, waiting up to
+DB_POOL_TIMEOUT_SECONDS when all are in use.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import psycopg2 as Database
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+from fusetalkconfig.metrics import get_counter, get_metric
+
+
+class PoolTimeout(Database.OperationalError):
+    """No pooled connection came free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    At most `size` connections to one database, handed out LIFO so the
+    warmest are reused and surplus idle ones age out. A connection idle longer
+    than `check_idle` seconds is pinged before reuse; one older than
+    `max_lifetime` seconds is closed instead of reused (0 disables either).
+    """
+
+    def __init__(self, name: str, database: str, size: int, timeout: float, check_idle: float,
+                 max_lifetime: float):
+        self.name = name
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_lifetime = max_lifetime
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # (connection, returned_at) stack
+        self._idle: List[Tuple[object, float]] = []
+        # id(connection) -> opened_at, for every connection the pool owns
+        self._opened: Dict[int, float] = {}
+        self._in_use = 0
+
+        self.wait = get_metric(f'{name}.wait')
+        self.checkouts = get_counter(f'{name}.checkouts')
+        self.timeouts = get_counter(f'{name}.timeouts')
+        self.connects = get_counter(f'{name}.connects')
+        self.discards = get_counter(f'{name}.discards')
+
+    def checkout(self, connect: Callable):
+        """Borrow a healthy connection, opening one with `connect()` if none is idle."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.timeouts.increment()
+            raise PoolTimeout(
+                f"No database connection became free within {self.timeout}s (pool size {self.size})"
+            )
+        self.wait.observe(time.monotonic() - started)
+        self.checkouts.increment()
+
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = connect()
+                self.connects.increment()
+                with self._lock:
+                    self._opened[id(connection)] = time.monotonic()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        return connection
+
+    def checkin(self, connection):
+        """Return a borrowed connection, rolled back; broken or expired ones are closed."""
+        try:
+            if connection.closed or self._expired(connection):
+                self._discard(connection)
+                return
+            status = connection.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                self._discard(connection)
+                return
+            if status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        except Database.Error:
+            self._discard(connection)
+        finally:
+            self._release()
+
+    def discard(self, connection):
+        """Close a borrowed connection instead of returning it."""
+        try:
+            self._discard(connection)
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': self.size, 'in_use': self._in_use, 'idle': len(self._idle)}
+
+    def _release(self):
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, returned_at = self._idle.pop()
+            if self._healthy(connection, returned_at):
+                return connection
+            self._discard(connection)
+
+    def _healthy(self, connection, returned_at: float) -> bool:
+        if connection.closed or self._expired(connection):
+            return False
+        if not self.check_idle or time.monotonic() - returned_at < self.check_idle:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def _expired(self, connection) -> bool:
+        if not self.max_lifetime:
+            return False
+        with self._lock:
+            opened_at = self._opened.get(id(connection), time.monotonic())
+        return time.monotonic() - opened_at > self.max_lifetime
+
+    def _discard(self, connection):
+        with self._lock:
+            self._opened.pop(id(connection), None)
+        self.discards.increment()
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, conn_params: dict, size: int, timeout: float,
+             check_idle: float, max_lifetime: float) -> ConnectionPool:
+    """The pool for these connection parameters, created on first use."""
+    # Test database setup connects to other databases under the same alias;
+    # pools of one alias share its metrics
+    key = (alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                f'db.pool.{alias}', conn_params.get('database'), size, timeout, check_idle, max_lifetime
+            )
+        return _pools[key]
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Occupancy of every pool in this process, keyed by alias:database."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {f'{alias}:{pool.database}': pool.stats() for (alias, _), pool in pools}
@@ -0,0 +1,110 @@
+"""
+Lightweight in-process latency metrics and event counters for the realtime
+hot paths, shared by the matching, chat and database layers. Latency metrics keep a bounded window of recent samples so
+percentiles can be reported without an external metrics backend.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Union
+
+
+class LatencyMetric:
+    """Rolling latency samples (seconds) with count/avg/percentile snapshots."""
+
+    def __init__(self, name: str, window: int = 2048):
+        self.name = name
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+        return {
+            'count': count,
+            'avg_ms': (total / count * 1000) if count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': maximum * 1000,
+        }
+
+
+class EventCounter:
+    """Monotonic count of events, e.g. messages suppressed by a throttle."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self, amount: int = 1):
+        with self._lock:
+            self.count += amount
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+    def snapshot(self) -> dict:
+        return {'count': self.count}
+
+
+_registry: Dict[str, Union[LatencyMetric, EventCounter]] = {}
+_registry_lock = threading.Lock()
+
+
+def get_metric(name: str) -> LatencyMetric:
+    """Return the metric with this name, creating it on first use."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LatencyMetric(name)
+        return _registry[name]
+
+
+def get_counter(name: str) -> EventCounter:
+    """Return the counter with this name, creating it on first use."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = EventCounter(name)
+        return _registry[name]
+
+
+def snapshot_all() -> Dict[str, dict]:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
@@ -0,0 +1,165 @@
+"""
+Multiplexed WebSocket: matching, chat and signaling over one connection.
+
+Client frames:
+    {"stream": "matching" | "chat:<session_id>" | "signaling:<session_id>", "action": "open" | "close"}
+    {"stream": "<stream>", "payload": {...}}   - forwarded to that stream's consumer
+Server frames:
+    {"stream": "<stream>", "payload": {...}}   - whatever the stream's consumer sent
+    {"stream": "<stream>", "payload": {"type": "stream_open" | "stream_closed", ...}}
+
+Each stream runs the regular consumer class in-process on the shared connection,
+so a client authenticates once and holds one channel name for all of its streams.
+An exception in one stream's consumer is logged and reported to the client as
+{"stream": "<stream>", "payload": {"type": "error", ...}}; the connection and its
+other streams stay open.
+Frames use the codec negotiated for the whole connection; payloads are passed to
+and from stream consumers as objects, never re-encoded.
+"""
+
+import logging
+import uuid
+
+from channels.exceptions import StopConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.consumer import get_handler_name
+
+from apps.chat.consumers import ChatConsumer, SignalingConsumer
+from apps.matching.consumers import MatchingConsumer
+from apps.users.principals import socket_principal
+from .codec import CodecConsumerMixin
+
+logger = logging.getLogger(__name__)
+
+STREAM_CONSUMERS = {
+    'matching': MatchingConsumer,
+    'chat': ChatConsumer,
+    'signaling': SignalingConsumer,
+}
+
+
+class MultiplexConsumer(CodecConsumerMixin, AsyncWebsocketConsumer):
+    """Demultiplexes stream frames onto per-stream consumers sharing this connection."""
+
+    async def connect(self):
+        self.user = socket_principal(self.scope['user'])
+        self.streams = {}
+
+        if self.user.is_anonymous:
+            await self.close(code=4001)
+            return
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for stream in list(getattr(self, 'streams', {})):
+            await self.close_stream(stream, close_code)
+
+    async def receive_payload(self, frame):
+        try:
+            stream = self.normalize_stream(frame['stream'])
+        except (KeyError, TypeError, ValueError):
+            await self.send_payload({'type': 'error', 'error': 'Invalid frame'})
+            return
+
+        action = frame.get('action')
+        if action == 'open':
+            await self.open_stream(stream)
+        elif action == 'close':
+            await self.close_stream(stream, 1000)
+        elif stream in self.streams:
+            await self.run_stream(stream, self.streams[stream].receive_payload, frame.get('payload', {}))
+        else:
+            await self.send_frame(stream, {'type': 'error', 'error': 'Stream is not open'})
+
+    @staticmethod
+    def normalize_stream(stream: str) -> str:
+        """Canonical stream name; session ids are validated and lower-cased."""
+        kind, _, session_id = stream.partition(':')
+        if kind not in STREAM_CONSUMERS or bool(session_id) == (kind == 'matching'):
+            raise ValueError(f"Unknown stream '{stream}'")
+        return f'{kind}:{uuid.UUID(session_id)}' if session_id else kind
+
+    async def open_stream(self, stream: str):
+        if stream in self.streams:
+            await self.send_frame(stream, {'type': 'stream_open'})
+            return
+
+        kind, _, session_id = stream.partition(':')
+        consumer = STREAM_CONSUMERS[kind]()
+        consumer.scope = {
+            **self.scope,
+            'url_route': {'args': (), 'kwargs': {'session_id': uuid.UUID(session_id)} if session_id else {}},
+        }
+        # Share this connection's channel name and layer; sends are wrapped into stream frames
+        consumer.channel_layer = self.channel_layer
+        consumer.channel_name = self.channel_name
+
+        async def base_send(message):
+            await self.stream_send(stream, message)
+
+        async def send_payload(payload):
+            await self.send_frame(stream, payload)
+
+        consumer.base_send = base_send
+        consumer.send_payload = send_payload
+        self.streams[stream] = consumer
+        await self.run_stream(stream, consumer.websocket_connect, {'type': 'websocket.connect'})
+
+    async def run_stream(self, stream: str, handler, message):
+        """Call a stream consumer's handler; a failure is reported on that stream only."""
+        try:
+            await handler(message)
+        except Exception:
+            logger.exception(f"Stream {stream} failed for user {self.user.id}")
+            await self.send_frame(stream, {'type': 'error', 'error': 'Stream error'})
+
+    async def close_stream(self, stream: str, code: int):
+        consumer = self.streams.pop(stream, None)
+        if consumer is None:
+            return
+        try:
+            await consumer.websocket_disconnect({'type': 'websocket.disconnect', 'code': code})
+        except StopConsumer:
+            pass
+
+    async def stream_send(self, stream: str, message: dict):
+        """ASGI send for one stream's consumer."""
+        if message['type'] == 'websocket.send':
+            # Payloads normally arrive via send_payload; this covers raw sends
+            await self.send_frame(stream, self.codec.decode(message.get('text') or message.get('bytes')))
+        elif message['type'] == 'websocket.accept':
+            await self.send_frame(stream, {'type': 'stream_open'})
+        elif message['type'] == 'websocket.close':
+            code = message.get('code', 1000)
+            await self.send_frame(stream, {'type': 'stream_closed', 'code': code})
+            await self.close_stream(stream, code)
+
+    async def send_frame(self, stream: str, payload: dict):
+        await self.send_payload({'stream': stream, 'payload': payload})
+
+    async def dispatch(self, message):
+        """Route channel layer events to the stream consumer that handles them."""
+        if message['type'].startswith('websocket.'):
+            await super().dispatch(message)
+            return
+
+        routed = self.route(message)
+        if routed is None:
+            logger.debug(f"No open stream for {message['type']} event")
+            return
+        stream, consumer = routed
+        await self.run_stream(stream, consumer.dispatch, message)
+
+    def route(self, message):
+        handler = get_handler_name(message)
+        session_id = str(message.get('session_id'))
+        for stream, consumer in self.streams.items():
+            if not hasattr(consumer, handler):
+                continue
+            # Session streams only take events for their own session
+            _, _, stream_session = stream.partition(':')
+            if stream_session and stream_session != session_id:
+                continue
+            return stream, consumer
+        return None
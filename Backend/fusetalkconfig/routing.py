@@ -9,9 +9,12 @@ from channels.auth import AuthMiddlewareStack
 
 from apps.chat.routing import websocket_urlpatterns as chat_patterns
 from apps.matching.routing import websocket_urlpatterns as matching_patterns
+from .multiplex import MultiplexConsumer
 
-# Combine all WebSocket URL patterns
-websocket_urlpatterns = chat_patterns + matching_patterns
+# Combine all WebSocket URL patterns; ws/ carries every stream over one socket
+websocket_urlpatterns = chat_patterns + matching_patterns + [
+    path('ws/', MultiplexConsumer.as_asgi(), name='multiplex_ws'),
+]
 
 application = ProtocolTypeRouter({
     'websocket': AuthMiddlewareStack(
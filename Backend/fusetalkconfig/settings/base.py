@@ -95,25 +95,127 @@ DATABASES = {
     }
 }
 
+# Connection pool for ASGI workers ('fusetalkconfig.db' backend): at most DB_POOL_SIZE
+# connections per process, borrowed per request / database_sync_to_async call. Checkouts
+# wait up to the timeout; connections idle longer than CHECK_IDLE are pinged before reuse
+DB_POOL_ENABLED = config('DB_POOL_ENABLED', default=False, cast=bool)
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT_SECONDS = config('DB_POOL_TIMEOUT_SECONDS', default=5, cast=float)
+DB_POOL_CHECK_IDLE_SECONDS = config('DB_POOL_CHECK_IDLE_SECONDS', default=30, cast=float)
+DB_POOL_MAX_LIFETIME_SECONDS = config('DB_POOL_MAX_LIFETIME_SECONDS', default=1800, cast=float)
+if DB_POOL_ENABLED:
+    DATABASES['default']['ENGINE'] = 'fusetalkconfig.db'
+
+# Redis (channel layer + ephemeral matching state)
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+
 # Django Channels configuration
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [config('REDIS_URL', default='redis://localhost:6379/0')],
+            'hosts': [REDIS_URL],
         },
     },
 }
 
+# Chat messages are broadcast first and written in batches: up to this many per
+# bulk insert, or after this many ms. 0 ms writes every message as it arrives.
+CHAT_MESSAGE_BATCH_SIZE = config('CHAT_MESSAGE_BATCH_SIZE', default=50, cast=int)
+CHAT_MESSAGE_FLUSH_MS = config('CHAT_MESSAGE_FLUSH_MS', default=250, cast=int)
+# A batch the database couldn't take (connection lost, failover) is kept and
+# retried after this many ms
+CHAT_MESSAGE_RETRY_MS = config('CHAT_MESSAGE_RETRY_MS', default=1000, cast=int)
+# Unwritten messages kept per worker while retrying; the oldest beyond this are dropped
+CHAT_MESSAGE_MAX_PENDING = config('CHAT_MESSAGE_MAX_PENDING', default=10000, cast=int)
+
+# Reconnect replay: the last N messages of each session, with server-assigned seqs.
+# 'redis' shares them across workers; 'memory' is per process (development only)
+CHAT_REPLAY_BACKEND = config('CHAT_REPLAY_BACKEND', default='redis')
+CHAT_REPLAY_REDIS_URL = config('CHAT_REPLAY_REDIS_URL', default=REDIS_URL)
+CHAT_REPLAY_BUFFER_SIZE = config('CHAT_REPLAY_BUFFER_SIZE', default=100, cast=int)
+CHAT_REPLAY_TTL_SECONDS = config('CHAT_REPLAY_TTL_SECONDS', default=3600, cast=int)
+
+# Typing indicators: only state changes are forwarded, "started typing" at most once per
+# interval, and the server sends "stopped typing" after this long without a typing frame
+CHAT_TYPING_MIN_INTERVAL_MS = config('CHAT_TYPING_MIN_INTERVAL_MS', default=1000, cast=int)
+CHAT_TYPING_TIMEOUT_MS = config('CHAT_TYPING_TIMEOUT_MS', default=5000, cast=int)
+
+# ICE candidates are forwarded to the peer in batches collected over this window (0 disables)
+SIGNALING_ICE_BATCH_MS = config('SIGNALING_ICE_BATCH_MS', default=20, cast=int)
+
+# How long chat/signaling consumers may authorize from cached session participants
+CHAT_SESSION_ACCESS_TTL_SECONDS = config('CHAT_SESSION_ACCESS_TTL_SECONDS', default=300, cast=int)
+
+# Shared cache (queue counters, stats snapshots)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default='redis://localhost:6379/1'),
+    },
+}
+
+# Matching queue engine: 'orm' (waiting ChatSession rows) or 'redis' (bucketed sorted sets)
+MATCH_QUEUE_ENGINE = config('MATCH_QUEUE_ENGINE', default='orm')
+MATCH_QUEUE_REDIS_URL = config('MATCH_QUEUE_REDIS_URL', default=REDIS_URL)
+# ORM engine: waiting sessions to try claiming per join before creating a new one
+MATCH_CLAIM_ATTEMPTS = config('MATCH_CLAIM_ATTEMPTS', default=3, cast=int)
+# ORM engine: oldest rows each partner rank group contributes to the ranked pick;
+# headroom for rows concurrent joiners have locked
+MATCH_CANDIDATES_PER_GROUP = config('MATCH_CANDIDATES_PER_GROUP', default=4, cast=int)
+# Minimum interval between pushed queue_update events per user (0 disables them)
+MATCH_QUEUE_UPDATE_INTERVAL_MS = config('MATCH_QUEUE_UPDATE_INTERVAL_MS', default=2000, cast=int)
+# Max age of the cached /api/match/stats/ snapshot
+MATCH_STATS_CACHE_SECONDS = config('MATCH_STATS_CACHE_SECONDS', default=1, cast=int)
+# Queue counters are rebuilt from the database this often, correcting any drift
+MATCH_QUEUE_COUNTERS_TTL_SECONDS = config('MATCH_QUEUE_COUNTERS_TTL_SECONDS', default=300, cast=int)
+
+# Batch matchmaking rounds: joins only enqueue, and `manage.py run_match_rounds`
+# pairs the whole pool once per tick
+MATCH_ROUNDS_ENABLED = config('MATCH_ROUNDS_ENABLED', default=False, cast=bool)
+MATCH_ROUND_TICK_MS = config('MATCH_ROUND_TICK_MS', default=250, cast=int)
+MATCH_ROUND_MAX_POOL = config('MATCH_ROUND_MAX_POOL', default=1000, cast=int)
+
+# Presence: a matching socket stays "online" at most this long after its last heartbeat;
+# heartbeats must come at least every half TTL (the frontend sends one every 30 s)
+MATCH_PRESENCE_TTL_SECONDS = config('MATCH_PRESENCE_TTL_SECONDS', default=90, cast=int)
+# Waiting entries younger than this are never reaped, so REST joins have time to connect
+MATCH_PRESENCE_GRACE_SECONDS = config('MATCH_PRESENCE_GRACE_SECONDS', default=60, cast=int)
+# `manage.py reap_waiting_sessions` sweep size and interval
+MATCH_REAPER_INTERVAL_SECONDS = config('MATCH_REAPER_INTERVAL_SECONDS', default=30, cast=int)
+MATCH_REAPER_BATCH_SIZE = config('MATCH_REAPER_BATCH_SIZE', default=500, cast=int)
+MATCH_REAPER_MAX_BATCHES = config('MATCH_REAPER_MAX_BATCHES', default=20, cast=int)
+
+# Token -> user principal cache for REST and WebSocket auth: per-process LRU entries
+# live this long, and are also shared through CACHES when AUTH_TOKEN_CACHE_SHARED is on
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=10000, cast=int)
+AUTH_TOKEN_CACHE_TTL_SECONDS = config('AUTH_TOKEN_CACHE_TTL_SECONDS', default=30, cast=int)
+AUTH_TOKEN_CACHE_SHARED = config('AUTH_TOKEN_CACHE_SHARED', default=True, cast=bool)
+AUTH_TOKEN_SHARED_TTL_SECONDS = config('AUTH_TOKEN_SHARED_TTL_SECONDS', default=300, cast=int)
+# Signed WebSocket connect tickets (POST /api/auth/ws-ticket/) are valid this long
+WS_TICKET_MAX_AGE_SECONDS = config('WS_TICKET_MAX_AGE_SECONDS', default=60, cast=int)
+
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'apps.users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON, plus MessagePack for clients that ask for application/msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'fusetalkconfig.codec.FastJSONRenderer',
+        'fusetalkconfig.codec.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'fusetalkconfig.codec.FastJSONParser',
+        'fusetalkconfig.codec.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
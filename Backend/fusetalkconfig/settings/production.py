@@ -10,7 +10,8 @@ SECURE_HSTS_SECONDS = 31536000
 SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 SECURE_HSTS_PRELOAD = True
 
-# Database connection pooling
+# Database connection pooling. Persistent per-thread connections pile up under
+# ASGI, so the pooled backend hands connections back after every use instead
 DATABASES['default'].update({
-    'CONN_MAX_AGE': 60,
+    'CONN_MAX_AGE': 0 if DB_POOL_ENABLED else 60,
 })
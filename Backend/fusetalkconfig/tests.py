@@ -0,0 +1,101 @@
+import json
+import uuid
+
+import msgpack
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from .codec import (
+    JSON, MSGPACK, DecodeError, FastJSONParser, FastJSONRenderer, JsonCodec, MessagePackParser,
+    MessagePackRenderer, negotiate,
+)
+
+
+class TagsSerializer(serializers.Serializer):
+    tags = serializers.ListField(child=serializers.IntegerField())
+
+
+class EchoView(APIView):
+    """Validates a TagsSerializer body and echoes it back."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = TagsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data)
+
+
+class CodecTests(SimpleTestCase):
+
+    def test_json_matches_drf_renderer(self):
+        data = {'id': uuid.uuid4(), 'at': timezone.now(), 'name': 'ü', 'items': [1, None, True]}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_int_keys(self):
+        # DRF reports ListField item errors keyed by index
+        serializer = TagsSerializer(data={'tags': [1, 'x']})
+        self.assertFalse(serializer.is_valid())
+        expected = json.loads(JSONRenderer().render(serializer.errors))
+        for codec in (JSON, JsonCodec(use_orjson=False)):
+            with self.subTest(orjson=codec.use_orjson):
+                self.assertEqual(json.loads(codec.encode(serializer.errors)), expected)
+        # MessagePack keeps int keys
+        self.assertIn(1, msgpack.unpackb(MSGPACK.encode(serializer.errors), strict_map_key=False)['tags'])
+
+    def test_decode_errors(self):
+        for codec in (JSON, JsonCodec(use_orjson=False), MSGPACK):
+            with self.subTest(codec=codec.name), self.assertRaises(DecodeError):
+                codec.decode(b'\xc1{not valid')
+
+    def test_parsers(self):
+        self.assertEqual(FastJSONParser().parse(_Stream(b'{"a": [1, 2]}')), {'a': [1, 2]})
+        self.assertEqual(MessagePackParser().parse(_Stream(msgpack.packb({'a': [1, 2]}))), {'a': [1, 2]})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(_Stream(b'{"a":'))
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    def test_subprotocol_negotiation(self):
+        self.assertEqual(negotiate(['fusetalk.msgpack', 'fusetalk.json']), (MSGPACK, 'fusetalk.msgpack'))
+        self.assertEqual(negotiate(['other', 'fusetalk.json']), (JSON, 'fusetalk.json'))
+        self.assertEqual(negotiate([]), (JSON, None))
+
+
+class _Stream:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class RestNegotiationTests(SimpleTestCase):
+    factory = APIRequestFactory()
+
+    def post(self, body: bytes, content_type: str, accept: str):
+        request = self.factory.post('/', body, content_type=content_type, HTTP_ACCEPT=accept)
+        response = EchoView.as_view()(request)
+        response.render()
+        return response
+
+    def test_msgpack_request_and_response(self):
+        response = self.post(msgpack.packb({'tags': [1, 2]}), 'application/msgpack', 'application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), {'tags': [1, 2]})
+
+    def test_json_validation_error_with_int_keys(self):
+        response = self.post(b'{"tags": [1, "x"]}', 'application/json', 'application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('1', json.loads(response.content)['tags'])
+
+    def test_malformed_body(self):
+        self.assertEqual(self.post(b'{"tags":', 'application/json', 'application/json').status_code, 400)
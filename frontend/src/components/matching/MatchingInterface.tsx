@@ -54,10 +54,25 @@ export default function MatchingInterface({ onMatchFound }: MatchingInterfacePro
       }
     } else if (message.type === 'queue_update') {
       setQueuePosition(message.position);
+    } else if (message.type === 'join_ack' && message.status === 'queued') {
+      // Matched acks are followed by match_found, which handles navigation
+      setMatchStatus({
+        status: 'queued',
+        session_id: message.session_id,
+        queue_position: message.queue_position,
+        message: message.message,
+      });
+    } else if (message.type === 'leave_ack') {
+      setMatchStatus(null);
+      setIsMatching(false);
+      setQueuePosition(null);
+    } else if (message.type === 'error') {
+      setError(message.details ? JSON.stringify(message.details) : message.error);
+      setIsMatching(false);
     }
   };
 
-  const { isConnected, connectionError } = useWebSocket(handleWebSocketMessage);
+  const { isConnected, connectionError, sendMessage } = useWebSocket(handleWebSocketMessage);
 
   const handleStartMatching = async () => {
     if (!selectedVibe) return;
@@ -74,6 +89,12 @@ export default function MatchingInterface({ onMatchFound }: MatchingInterfacePro
         is_visitor: user?.country !== 'Rwanda',
       };
 
+      // Join over the open matching socket; REST is the fallback
+      if (isConnected) {
+        sendMessage({ type: 'join', ...matchRequest });
+        return;
+      }
+
       const response = await matchingAPI.joinQueue(matchRequest);
       setMatchStatus(response);
 
@@ -87,6 +108,11 @@ export default function MatchingInterface({ onMatchFound }: MatchingInterfacePro
   };
 
   const handleStopMatching = async () => {
+    if (isConnected) {
+      sendMessage({ type: 'leave' });
+      return;
+    }
+
     try {
       await matchingAPI.leaveQueue();
       setMatchStatus(null);